@@ -1,15 +1,43 @@
+import base64
+import csv
+import hmac
+import io
+import json
+import mimetypes
 import os
+import re
 import sqlite3
+import threading
+import time
 import uuid
-from datetime import datetime
-from dotenv import load_dotenv
+import zlib
+import zoneinfo
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import quote as url_quote
 from flask import (
     Flask, render_template, request, redirect, url_for, flash,
-    send_from_directory, session, Response, jsonify
+    send_from_directory, session, Response, jsonify, g, stream_with_context,
+    Request, current_app, abort
 )
-from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import safe_join
 from flask_wtf import CSRFProtect
 from flask_wtf.csrf import generate_csrf, CSRFError
+from markupsafe import Markup
+
+import archive
+import cache
+import compress
+import counters
+import db
+import media
+import metrics
+import migrations
+import querylog
+import ratelimit
+import search
+import thumbnails
+import uploads
 
 # For serverless (e.g., Vercel), use /tmp (writable, but ephemeral).
 # For local/dev, default to project dir unless DATA_ROOT is explicitly set.
@@ -24,12 +52,19 @@ else:
 UPLOAD_FOLDER = os.path.join(DATA_ROOT, 'uploads')
 DB_PATH = os.path.join(DATA_ROOT, 'instance', 'complaints.db')
 
-load_dotenv(os.path.join(BASE_DIR, '.env'))
+ENV_FILE = os.path.join(BASE_DIR, '.env')
+if os.path.exists(ENV_FILE):
+    # python-dotenv is slow to import; serverless deploys have no .env to load
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'avi', 'webm', 'mkv'}
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi', 'webm', 'mkv'}
 
+# ab/<sha256>.<ext>[.<size>.<fmt>] -- content never changes for a given name
+HASHED_MEDIA_RE = re.compile(r'^[0-9a-f]{2}/([0-9a-f]{64}\.[A-Za-z0-9.]+)$')
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -43,68 +78,339 @@ def is_video_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_VIDEO_EXTENSIONS
 
 
-def create_app():
+class UploadRequest(Request):
+    """Request that spools file uploads straight into the media store's temp dir."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename:
+            return media.HashingSpoolFile(current_app.config['UPLOAD_FOLDER'])
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def create_app(test_config=None):
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_secret')
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['DATABASE'] = DB_PATH
     app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_PASSWORD', 'admin')
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', db.DEFAULT_POOL_SIZE))
+    app.config['DB_BUSY_TIMEOUT_MS'] = int(os.environ.get('DB_BUSY_TIMEOUT_MS', db.DEFAULT_BUSY_TIMEOUT_MS))
+    app.config['DB_CACHE_SIZE_KB'] = int(os.environ.get('DB_CACHE_SIZE_KB', db.DEFAULT_CACHE_SIZE_KB))
+    app.config['DB_MMAP_SIZE'] = int(os.environ.get('DB_MMAP_SIZE', db.DEFAULT_MMAP_SIZE))
+    # Funnel submissions through one batching writer thread (see db.GroupCommitWriter)
+    app.config['GROUP_COMMIT'] = os.environ.get('GROUP_COMMIT', '').lower() in ('1', 'true', 'yes')
+    app.config['GROUP_COMMIT_WINDOW_MS'] = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', 2))
+    app.config['GROUP_COMMIT_TIMEOUT'] = 10
+    app.config['TRACK_CACHE_SIZE'] = int(os.environ.get('TRACK_CACHE_SIZE', 1024))
+    app.config['TRACK_CACHE_TTL'] = float(os.environ.get('TRACK_CACHE_TTL', 30))
+    app.config['PROXY_COUNT'] = int(os.environ.get('PROXY_COUNT', 0))
+    # Token buckets as '<requests>/<seconds>'; RATE_LIMIT_STORE=sqlite shares them across workers
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    app.config['RATE_LIMIT_STORE'] = os.environ.get('RATE_LIMIT_STORE', 'memory')
+    # Per-client buckets need real client addresses: by default they only
+    # apply with PROXY_COUNT set (behind a proxy every client shares its IP).
+    # Set RATE_LIMIT_PER_IP=1 when clients connect directly.
+    app.config['RATE_LIMIT_PER_IP'] = os.environ.get('RATE_LIMIT_PER_IP', '')
+    # Per-IP allowances leave room for a hostel or campus NAT
+    app.config['RATE_LIMIT_SUBMIT_IP'] = os.environ.get('RATE_LIMIT_SUBMIT_IP', '60/600')
+    app.config['RATE_LIMIT_SUBMIT_GLOBAL'] = os.environ.get('RATE_LIMIT_SUBMIT_GLOBAL', '200/10')
+    app.config['RATE_LIMIT_TRACK_IP'] = os.environ.get('RATE_LIMIT_TRACK_IP', '120/60')
+    app.config['RATE_LIMIT_TRACK_GLOBAL'] = os.environ.get('RATE_LIMIT_TRACK_GLOBAL', '500/10')
+    app.config['ADMIN_PAGE_SIZE'] = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+    app.config['ADMIN_MAX_PAGE_SIZE'] = 500
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+    app.config['THUMBNAIL_WORKERS'] = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+    app.config['MEDIA_CACHE_MAX_AGE'] = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 365 * 24 * 3600))
+    # e.g. '/protected-uploads' mapped to UPLOAD_FOLDER by an nginx `internal` location
+    app.config['MEDIA_ACCEL_REDIRECT'] = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+    app.config['MEDIA_JANITOR_INTERVAL'] = float(os.environ.get('MEDIA_JANITOR_INTERVAL', 30))
+    app.config['MEDIA_JANITOR_BATCH'] = int(os.environ.get('MEDIA_JANITOR_BATCH', 200))
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    # Lets a Prometheus scraper read /admin/metrics with "Authorization: Bearer <token>"
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+    # Statements slower than this are kept (with their query plan) on /admin/status; 0 turns it off
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+    app.config['SLOW_QUERY_LOG_SIZE'] = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 50))
+    # Serverless cold starts: skip start-up work that the first request can do instead
+    app.config['FAST_BOOT'] = os.environ.get('FAST_BOOT', '1' if os.environ.get('VERCEL') else '').lower() in ('1', 'true', 'yes')
+    # Resumable video uploads: largest file, largest chunk per request, and how
+    # many chunk requests one worker process serves at once (others get 503)
+    app.config['VIDEO_UPLOAD_MAX_SIZE'] = int(os.environ.get('VIDEO_UPLOAD_MAX_SIZE', 512 * 1024 * 1024))
+    app.config['VIDEO_UPLOAD_CHUNK_SIZE'] = int(os.environ.get('VIDEO_UPLOAD_CHUNK_SIZE', 2 * 1024 * 1024))
+    app.config['VIDEO_UPLOAD_CONCURRENCY'] = int(os.environ.get('VIDEO_UPLOAD_CONCURRENCY', 2))
+    # Closed complaints older than ARCHIVE_AFTER_DAYS move to a separate
+    # database (default: archive.db next to DATABASE), by `manage.py archive`
+    # or every ARCHIVE_INTERVAL seconds when that is set
+    app.config['ARCHIVE_DATABASE'] = os.environ.get('ARCHIVE_DATABASE', '')
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    app.config['ARCHIVE_INTERVAL'] = float(os.environ.get('ARCHIVE_INTERVAL', 0))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    # gzip/brotli for text responses of at least COMPRESS_MIN_SIZE bytes (streamed ones always)
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_BR_QUALITY'] = int(os.environ.get('COMPRESS_BR_QUALITY', 4))
+    # Compiled templates are kept on disk (default: template_cache/ next to
+    # DATABASE) so a fresh process skips compiling them
+    app.config['TEMPLATE_BYTECODE_CACHE'] = os.environ.get('TEMPLATE_BYTECODE_CACHE', '1').lower() in ('1', 'true', 'yes')
+    app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', '')
+    # Rendered admin list rows, keyed by complaint id and row version; 0 turns it off
+    app.config['ROW_CACHE_SIZE'] = int(os.environ.get('ROW_CACHE_SIZE', 5000))
+    # Time zone the admin date filters' days are in (an IANA name)
+    app.config['APP_TIMEZONE'] = os.environ.get('APP_TIMEZONE', 'UTC')
+    if test_config:
+        # Overrides for tests and benchmarks (e.g. a different DATABASE)
+        app.config.update(test_config)
+    if app.config['RATE_LIMIT_PER_IP'] in ('', None):
+        app.config['RATE_LIMIT_PER_IP'] = app.config['PROXY_COUNT'] > 0
+    elif isinstance(app.config['RATE_LIMIT_PER_IP'], str):
+        app.config['RATE_LIMIT_PER_IP'] = app.config['RATE_LIMIT_PER_IP'].lower() in ('1', 'true', 'yes')
+    if not app.config['ARCHIVE_DATABASE']:
+        app.config['ARCHIVE_DATABASE'] = os.path.join(os.path.dirname(app.config['DATABASE']), 'archive.db')
+    # The status/day counters bucket days in UTC, so they only answer date ranges there
+    utc_days = app.config['APP_TIMEZONE'] in ('UTC', 'Etc/UTC', 'GMT')
+    # UTC needs no tz database (zoneinfo only finds one via tzdata on Windows
+    # and minimal images)
+    app_tz = timezone.utc if utc_days else zoneinfo.ZoneInfo(app.config['APP_TIMEZONE'])
+    if not app.config['TEMPLATE_CACHE_DIR']:
+        app.config['TEMPLATE_CACHE_DIR'] = os.path.join(os.path.dirname(app.config['DATABASE']), 'template_cache')
 
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    if not app.config['FAST_BOOT']:
+        # media.store() creates the folders it writes to
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(os.path.dirname(app.config['DATABASE']), exist_ok=True)
 
+    if app.config['PROXY_COUNT']:
+        # Trust X-Forwarded-For/-Proto from this many proxies (for per-client limits)
+        n = app.config['PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=n, x_proto=n)
+
+    request_metrics = metrics.RequestMetrics() if app.config['METRICS_ENABLED'] else None
+    app.extensions['request_metrics'] = request_metrics
+
+    # First before_request hook, so rejected and failed requests are timed too
+    @app.before_request
+    def start_request_timer():
+        if request_metrics is not None:
+            g.request_started = time.perf_counter()
+            g.request_db = {'time': 0.0, 'queries': 0}
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        status = response.status_code
+        db_totals = g.request_db
+        sent = {'bytes': response.content_length}
+        if sent['bytes'] is None and response.is_streamed and not response.direct_passthrough:
+            sent['bytes'] = 0
+            response.response = _count_bytes(response.response, sent)
+
+        # Runs once the body has been sent, after teardown has added the DB time
+        def record():
+            request_metrics.observe(endpoint, method, status, time.perf_counter() - started, sent['bytes'],
+                                    db_totals['time'], db_totals['queries'])
+
+        response.call_on_close(record)
+        return response
+
+    def _count_bytes(body, sent):
+        try:
+            for chunk in body:
+                sent['bytes'] += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    if app.config['COMPRESS_ENABLED']:
+        # Registered after record_request_metrics, so it runs first and the
+        # metrics count the bytes actually sent
+        @app.after_request
+        def compress_response(response):
+            return compress.compress_response(
+                response, compress.choose_encoding(request.accept_encodings),
+                gzip_level=app.config['COMPRESS_LEVEL'], brotli_quality=app.config['COMPRESS_BR_QUALITY'],
+                min_size=app.config['COMPRESS_MIN_SIZE'],
+            )
+
+    def static_file(filename):
+        # Prefer a .br/.gz copy made by `manage.py compress-static`
+        variant = compress.precompressed_variant(app.static_folder, filename, request.accept_encodings)
+        if variant is None:
+            resp = app.send_static_file(filename)
+        else:
+            resp = send_from_directory(app.static_folder, variant[0], mimetype=mimetypes.guess_type(filename)[0],
+                                       max_age=app.get_send_file_max_age(filename))
+            resp.headers['Content-Encoding'] = variant[1]
+        if resp.mimetype in compress.COMPRESSIBLE_TYPES:
+            resp.vary.add('Accept-Encoding')
+        return resp
+
+    app.view_functions['static'] = static_file
+
+    limiter = None
+    if app.config['RATE_LIMIT_ENABLED']:
+        if app.config['RATE_LIMIT_STORE'] == 'sqlite':
+            store = ratelimit.SQLiteStore(os.path.join(os.path.dirname(app.config['DATABASE']), 'ratelimit.db'))
+        else:
+            store = ratelimit.MemoryStore()
+        per_ip = app.config['RATE_LIMIT_PER_IP']
+        limiter = ratelimit.RateLimiter(store, {
+            'submit': {'ip': per_ip and app.config['RATE_LIMIT_SUBMIT_IP'], 'global': app.config['RATE_LIMIT_SUBMIT_GLOBAL']},
+            'track_complaint': {'ip': per_ip and app.config['RATE_LIMIT_TRACK_IP'], 'global': app.config['RATE_LIMIT_TRACK_GLOBAL']},
+            'create_video_upload': {'ip': per_ip and app.config['RATE_LIMIT_SUBMIT_IP'], 'global': app.config['RATE_LIMIT_SUBMIT_GLOBAL']},
+        })
+    app.extensions['rate_limiter'] = limiter
+
+    # Registered before CSRFProtect so it runs before the form body (and any
+    # upload in it) is parsed: rejected clients cost almost nothing.
+    @app.before_request
+    def shed_load():
+        if limiter is None or request.method != 'POST':
+            return None
+        wait = limiter.check(request.endpoint, request.remote_addr)
+        if wait:
+            resp = Response('Too many requests. Please try again shortly.\n', status=429, mimetype='text/plain')
+            resp.headers['Retry-After'] = str(wait)
+            return resp
+        return None
+
     csrf = CSRFProtect()
     csrf.init_app(app)
     app.jinja_env.globals['csrf_token'] = lambda: generate_csrf()
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        try:
+            os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        except OSError:
+            pass  # read-only deploy: templates are compiled in memory as usual
+        app.jinja_env.bytecode_cache = cache.TemplateBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+    slow_queries = None
+    if app.config['SLOW_QUERY_MS'] > 0:
+        slow_queries = querylog.SlowQueryLog(app.config['SLOW_QUERY_MS'], app.config['SLOW_QUERY_LOG_SIZE'])
+    app.extensions['slow_queries'] = slow_queries
+    statement_hook = slow_queries.record if slow_queries is not None else None
+
+    pool = db.ConnectionPool(
+        app.config['DATABASE'],
+        size=app.config['DB_POOL_SIZE'],
+        timed=request_metrics is not None,
+        statement_hook=statement_hook,
+        busy_timeout_ms=app.config['DB_BUSY_TIMEOUT_MS'],
+        cache_size_kb=app.config['DB_CACHE_SIZE_KB'],
+        mmap_size=app.config['DB_MMAP_SIZE'],
+    )
+    app.extensions['db_pool'] = pool
+
+    thumbs = thumbnails.ThumbnailWorker(app.config['UPLOAD_FOLDER'], app.config['THUMBNAIL_WORKERS'])
+    app.extensions['thumbnails'] = thumbs
+
+    janitor = media.MediaJanitor(
+        pool, app.config['UPLOAD_FOLDER'],
+        interval=app.config['MEDIA_JANITOR_INTERVAL'],
+        batch_size=app.config['MEDIA_JANITOR_BATCH'],
+    )
+    if not app.testing:
+        # First pass after one interval, so start-up itself stays cheap
+        janitor.start()
+    app.extensions['media_janitor'] = janitor
+
+    writer = None
+    if app.config['GROUP_COMMIT']:
+        writer = db.GroupCommitWriter(
+            app.config['DATABASE'],
+            window_ms=app.config['GROUP_COMMIT_WINDOW_MS'],
+            statement_hook=statement_hook,
+            busy_timeout_ms=app.config['DB_BUSY_TIMEOUT_MS'],
+            cache_size_kb=app.config['DB_CACHE_SIZE_KB'],
+            mmap_size=app.config['DB_MMAP_SIZE'],
+        )
+    app.extensions['group_commit'] = writer
+
+    archiver = archive.ArchiveJob(
+        pool, app.config['ARCHIVE_DATABASE'], app.config['ARCHIVE_AFTER_DAYS'],
+        interval=app.config['ARCHIVE_INTERVAL'], batch_size=app.config['ARCHIVE_BATCH_SIZE'],
+    )
+    archiver.start()
+    app.extensions['archive_job'] = archiver
+
+    # Rendered public /track pages, tagged with the complaint id for invalidation
+    track_cache = cache.LRUCache(maxsize=app.config['TRACK_CACHE_SIZE'], ttl=app.config['TRACK_CACHE_TTL'])
+    app.extensions['track_cache'] = track_cache
+
+    # Admin list row HTML. The version column changes with every edit, so
+    # entries never go stale and the TTL only bounds memory held by old rows.
+    row_cache = cache.LRUCache(maxsize=app.config['ROW_CACHE_SIZE'], ttl=24 * 3600)
+    app.extensions['row_cache'] = row_cache
 
     def get_db_connection():
-        conn = sqlite3.connect(app.config['DATABASE'])
-        conn.row_factory = sqlite3.Row
-        return conn
+        # One pooled connection per app context; returned to the pool on teardown
+        if 'db' not in g:
+            g.db = pool.acquire()
+            if request_metrics is not None:
+                g.db.reset_timing()
+        return g.db
+
+    @app.teardown_appcontext
+    def release_db_connection(exc):
+        conn = g.pop('db', None)
+        if conn is not None:
+            db_totals = g.get('request_db')
+            if db_totals is not None:
+                db_totals['time'] += conn.db_time
+                db_totals['queries'] += conn.db_queries
+            pool.release(conn)
 
     def init_db():
         conn = get_db_connection()
-        conn.execute(
-            '''
-            CREATE TABLE IF NOT EXISTS complaints (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                room TEXT,
-                title TEXT,
-                description TEXT,
-                image TEXT,
-                address TEXT,
-                phone TEXT,
-                access_code TEXT,
-                status TEXT DEFAULT 'open',
-                created_at TEXT
-            )
-            '''
-        )
-        cur = conn.execute("PRAGMA table_info(complaints)")
-        cols = [r[1] for r in cur.fetchall()]
-        # Add missing columns if the DB was created by an older version
-        if 'access_code' not in cols:
-            conn.execute('ALTER TABLE complaints ADD COLUMN access_code TEXT')
-            cols.append('access_code')
-        if 'address' not in cols:
-            conn.execute('ALTER TABLE complaints ADD COLUMN address TEXT')
-            cols.append('address')
-        if 'phone' not in cols:
-            conn.execute('ALTER TABLE complaints ADD COLUMN phone TEXT')
-            cols.append('phone')
-        if 'video' not in cols:
-            conn.execute('ALTER TABLE complaints ADD COLUMN video TEXT')
-            cols.append('video')
-        conn.commit()
-        conn.close()
+        version = migrations.migrate(conn)
+        app.config['FTS_ENABLED'] = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'complaints_fts'"
+        ).fetchone() is not None
+        # Set last: FAST_BOOT treats it as "initialised"
+        app.config['SCHEMA_VERSION'] = version
 
-    init_db()
+    if app.config['FAST_BOOT']:
+        # Opening the database and checking the schema waits for the first
+        # request; requests that arrive together may both run init_db(),
+        # which is safe because migrations re-check the version under a lock.
+        @app.before_request
+        def init_db_once():
+            if 'SCHEMA_VERSION' not in app.config:
+                init_db()
+    else:
+        with app.app_context():
+            init_db()
 
     @app.route('/')
     def index():
         return redirect(url_for('submit'))
 
+    def _insert_complaint(conn, values):
+        """Insert a complaint (without committing) and return (id, access_code)."""
+        for attempt in range(3):
+            access_code = uuid.uuid4().hex[:10]
+            now = datetime.now(timezone.utc)
+            try:
+                cur = conn.execute(
+                    'INSERT INTO complaints (name, room, title, description, image, video, address, phone, access_code, created_at, created_ts)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    values + (access_code, now.replace(tzinfo=None).isoformat(), int(now.timestamp()))
+                )
+            except sqlite3.IntegrityError:
+                # access_code is unique; draw a new one on the rare collision.
+                # Only the failed statement is undone, not the transaction.
+                if attempt == 2:
+                    raise
+                continue
+            return cur.lastrowid, access_code
+
     @app.route('/submit', methods=['GET', 'POST'])
     def submit():
         if request.method == 'POST':
@@ -122,61 +428,198 @@ def create_app():
 
             image_filename = None
             video_filename = None
-            
-            # Handle image upload
+            # (path, spare) of stored media, settled once the complaint is saved
+            stored = []
+
+            # Uploads are stored by content hash, so re-submitted media is kept once
             image_file = request.files.get('image')
             if image_file and image_file.filename and is_image_file(image_file.filename):
-                filename = secure_filename(image_file.filename)
-                timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                image_file.save(path)
-                image_filename = filename
-            
-            # Handle video upload
-            video_file = request.files.get('video')
-            if video_file and video_file.filename and is_video_file(video_file.filename):
-                filename = secure_filename(video_file.filename)
-                timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                video_file.save(path)
-                video_filename = filename
+                ext = image_file.filename.rsplit('.', 1)[1].lower()
+                stored.append(media.store(app.config['UPLOAD_FOLDER'], image_file, ext))
+                image_filename = stored[-1][0]
 
-            access_code = uuid.uuid4().hex[:10]
-            conn = get_db_connection()
-            cur = conn.execute(
-                'INSERT INTO complaints (name, room, title, description, image, video, address, phone, access_code, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                (name, room, title, description, image_filename, video_filename, address, phone, access_code, datetime.utcnow().isoformat())
-            )
-            conn.commit()
-            complaint_id = cur.lastrowid
-            conn.close()
+            try:
+                video_upload = request.form.get('video_upload')
+                video_file = request.files.get('video')
+                if video_upload:
+                    # Sent ahead of the form in chunks (see create_video_upload)
+                    claimed = uploads.claim(app.config['UPLOAD_FOLDER'], video_upload)
+                    if claimed is None:
+                        flash('The video upload did not finish. Please attach it again.', 'danger')
+                        return render_template('submit.html')
+                    stored.append(claimed)
+                    video_filename = claimed[0]
+                elif video_file and video_file.filename and is_video_file(video_file.filename):
+                    ext = video_file.filename.rsplit('.', 1)[1].lower()
+                    stored.append(media.store(app.config['UPLOAD_FOLDER'], video_file, ext))
+                    video_filename = stored[-1][0]
+
+                values = (name, room, title, description, image_filename, video_filename, address, phone)
+                if writer is not None:
+                    # Batched with concurrent submissions into one transaction
+                    complaint_id, access_code = writer.submit(
+                        lambda conn: _insert_complaint(conn, values), timeout=app.config['GROUP_COMMIT_TIMEOUT']
+                    )
+                else:
+                    conn = get_db_connection()
+                    complaint_id, access_code = _insert_complaint(conn, values)
+                    conn.commit()
+            finally:
+                for rel, spare in stored:
+                    media.settle(app.config['UPLOAD_FOLDER'], rel, spare)
+            thumbs.submit(image_filename)
             # Redirect to a success page so URL reflects completion and user can refresh safely
             return redirect(url_for('submit_success', complaint_id=complaint_id, access_code=access_code))
         return render_template('submit.html')
 
+    video_upload_slots = threading.BoundedSemaphore(max(1, app.config['VIDEO_UPLOAD_CONCURRENCY']))
+
+    def _upload_response(payload, status=200, offset=None):
+        resp = jsonify(payload)
+        resp.status_code = status
+        resp.headers['Cache-Control'] = 'no-store'
+        if offset is not None:
+            resp.headers['Upload-Offset'] = str(offset)
+        return resp
+
+    @app.route('/submit/video-uploads', methods=['POST'])
+    def create_video_upload():
+        """Open a resumable upload; the client then PATCHes the file in chunks."""
+        data = request.get_json(silent=True) or request.form
+        # Only the extension is kept; the stored file is named by its hash
+        filename = str(data.get('filename', ''))
+        try:
+            length = int(data.get('size'))
+        except (TypeError, ValueError):
+            length = 0
+        if not is_video_file(filename):
+            return _upload_response({'error': 'Unsupported video type'}, 400)
+        if not 0 < length <= app.config['VIDEO_UPLOAD_MAX_SIZE']:
+            return _upload_response({'error': 'Video is empty or too large',
+                                     'max_size': app.config['VIDEO_UPLOAD_MAX_SIZE']}, 413)
+        upload_id = uploads.create(app.config['UPLOAD_FOLDER'], filename.rsplit('.', 1)[1].lower(), length)
+        url = url_for('video_upload', upload_id=upload_id)
+        resp = _upload_response({'upload_id': upload_id, 'url': url, 'offset': 0, 'length': length,
+                                 'chunk_size': app.config['VIDEO_UPLOAD_CHUNK_SIZE']}, 201, 0)
+        resp.headers['Location'] = url
+        return resp
+
+    @app.route('/submit/video-uploads/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+    def video_upload(upload_id):
+        """GET: current offset (to resume); PATCH: append a chunk at Upload-Offset; DELETE: abort."""
+        folder = app.config['UPLOAD_FOLDER']
+        if request.method == 'DELETE':
+            uploads.discard(folder, upload_id)
+            return '', 204
+        try:
+            if request.method == 'PATCH':
+                offset = request.headers.get('Upload-Offset', type=int)
+                if offset is None:
+                    raise uploads.UploadError('Upload-Offset header required')
+                if request.content_length is None:
+                    raise uploads.UploadError('Content-Length required', 411)
+                if request.content_length > app.config['VIDEO_UPLOAD_CHUNK_SIZE']:
+                    raise uploads.UploadError('Chunk too large', 413)
+                # Chunk requests never take every thread of a worker, so page
+                # views keep being served while videos trickle in
+                if not video_upload_slots.acquire(blocking=False):
+                    raise uploads.UploadError('Too many uploads in progress', 503)
+                try:
+                    info = uploads.append(folder, upload_id, offset, request.stream, request.content_length)
+                finally:
+                    video_upload_slots.release()
+            else:
+                info = uploads.status(folder, upload_id)
+                if info is None:
+                    raise uploads.UploadError('Unknown or expired upload', 404)
+        except uploads.UploadError as e:
+            resp = _upload_response({'error': str(e), 'offset': e.offset}, e.status, e.offset)
+            if e.status == 503:
+                resp.headers['Retry-After'] = '1'
+            return resp
+        return _upload_response({'offset': info['offset'], 'length': info['length'],
+                                 'complete': bool(info['path'])}, offset=info['offset'])
+
     @app.route('/track', methods=['GET', 'POST'])
     def track_complaint():
         if request.method == 'POST':
             access_code = request.form.get('access_code', '').strip()
             complaint_id = request.form.get('complaint_id', '').strip()
             if access_code or complaint_id:
-                conn = get_db_connection()
                 if complaint_id:
-                    row = conn.execute('SELECT * FROM complaints WHERE id = ?', (complaint_id,)).fetchone()
+                    key = ('id', complaint_id)
                 else:
-                    row = conn.execute('SELECT * FROM complaints WHERE access_code = ?', (access_code,)).fetchone()
-                conn.close()
+                    key = ('code', access_code)
+                html = track_cache.get(key)
+                if html is not None:
+                    return html
+                conn = get_db_connection()
+                where, arg = ('id = ?', complaint_id) if complaint_id else ('access_code = ?', access_code)
+                row = conn.execute(f'SELECT * FROM complaints WHERE {where}', (arg,)).fetchone()
+                if row is None and archive.attach(conn, app.config['ARCHIVE_DATABASE']):
+                    row = conn.execute(f'SELECT * FROM archive.complaints WHERE {where}', (arg,)).fetchone()
                 if row:
-                    return render_template('view_complaint.html', c=dict(row), is_public=True)
+                    # Pending flash messages would be baked into the page; skip caching then
+                    cacheable = not session.get('_flashes')
+                    html = render_template('view_complaint.html', c=dict(row), is_public=True)
+                    if cacheable:
+                        track_cache.set(key, html, tags=(row['id'],))
+                    return html
                 else:
                     flash('Complaint not found. Please check your access code or complaint ID.', 'danger')
         return render_template('track_complaint.html')
 
+    def _send_media(rel, immutable=True):
+        """Send a file from UPLOAD_FOLDER with long-lived caching.
+
+        Content-addressed files use their hash as a strong ETag. When
+        MEDIA_ACCEL_REDIRECT is set the front proxy (nginx) streams the bytes,
+        Range requests included; USE_X_SENDFILE does the same for Apache.
+        """
+        path = safe_join(app.config['UPLOAD_FOLDER'], rel)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        hashed = HASHED_MEDIA_RE.match(rel)
+        etag = hashed.group(1) if hashed else True
+        max_age = app.config['MEDIA_CACHE_MAX_AGE'] if immutable else None
+        accel = app.config['MEDIA_ACCEL_REDIRECT']
+        if accel:
+            resp = Response(mimetype=mimetypes.guess_type(rel)[0] or 'application/octet-stream')
+            resp.headers['X-Accel-Redirect'] = accel.rstrip('/') + '/' + url_quote(rel)
+            if hashed:
+                resp.set_etag(etag)
+            resp.make_conditional(request)
+        else:
+            resp = send_from_directory(app.config['UPLOAD_FOLDER'], rel, etag=etag, max_age=max_age)
+        if immutable:
+            resp.cache_control.public = True
+            resp.cache_control.max_age = max_age
+            resp.cache_control.immutable = True
+        else:
+            resp.cache_control.no_cache = True
+        return resp
+
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return _send_media(filename)
+
+    @app.route('/media/<size>/<path:filename>')
+    def media_rendition(size, filename):
+        # Serve a downscaled copy when one exists, otherwise the original
+        if size in thumbnails.RENDITIONS and is_image_file(filename):
+            formats = thumbnails.supported_formats()
+            if 'image/webp' not in request.accept_mimetypes:
+                formats = tuple(f for f in formats if f != 'webp')
+            for fmt in formats:
+                rel = thumbnails.rendition_path(filename, size, fmt)
+                path = safe_join(app.config['UPLOAD_FOLDER'], rel)
+                if path and os.path.isfile(path):
+                    resp = _send_media(rel)
+                    resp.vary.add('Accept')
+                    return resp
+            thumbs.submit(filename)
+        # Not cached for long: the rendition may be ready on the next request
+        return _send_media(filename, immutable=False)
 
     @app.route('/submit/success')
     def submit_success():
@@ -213,6 +656,91 @@ def create_app():
         flash('Logged out', 'info')
         return redirect(url_for('admin_login'))
 
+    def _day_start(day, days_after=0):
+        """Unix time of midnight in APP_TIMEZONE starting YYYY-MM-DD ``day`` (+ ``days_after``), or None."""
+        try:
+            d = date.fromisoformat(day) + timedelta(days=days_after)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        return int(datetime(d.year, d.month, d.day, tzinfo=app_tz).timestamp())
+
+    def _date_range(column, date_from, date_to):
+        """WHERE clauses and params for an inclusive day range on an epoch column.
+
+        ``date_to`` includes its whole day: the upper bound is the next
+        midnight, exclusive, so fractional seconds can't slip past it.
+        Unparseable dates are ignored.
+        """
+        where = []
+        params = []
+        start = _day_start(date_from) if date_from else None
+        if start is not None:
+            where.append(f'{column} >= ?')
+            params.append(start)
+        end = _day_start(date_to, 1) if date_to else None
+        if end is not None:
+            where.append(f'{column} < ?')
+            params.append(end)
+        return where, params
+
+    def _list_filters(search_query, status, date_from, date_to, schema='main'):
+        """FROM/WHERE pieces shared by the admin list page and its summary counts.
+
+        ``schema='archive'`` builds the same query against the attached archive.
+        """
+        where = []
+        params = []
+        match = search.match_expression(search_query) if app.config['FTS_ENABLED'] else ''
+        if match:
+            # Ranked full-text search through the FTS5 index
+            from_sql = f'{schema}.complaints_fts JOIN {schema}.complaints c ON c.id = complaints_fts.rowid'
+            where.append('complaints_fts MATCH ?')
+            params.append(match)
+        else:
+            from_sql = f'{schema}.complaints c'
+            if search_query:
+                where.append('(c.title LIKE ? OR c.description LIKE ? OR c.name LIKE ? OR c.room LIKE ? OR c.address LIKE ?)')
+                search_pattern = f'%{search_query}%'
+                params.extend([search_pattern] * 5)
+        if status:
+            where.append('c.status = ?')
+            params.append(status)
+        range_where, range_params = _date_range('c.created_ts', date_from, date_to)
+        where.extend(range_where)
+        params.extend(range_params)
+        return match, from_sql, where, params
+
+    def _encode_cursor(key, row_id):
+        raw = json.dumps([key, row_id]).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def _decode_cursor(value):
+        if not value:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+            key, row_id = json.loads(raw)
+        except (ValueError, TypeError):
+            return None
+        if not isinstance(row_id, int):
+            return None
+        return key, row_id
+
+    def _archive_requested(conn):
+        """True if the request opts in with ``?archive=1`` and an archive exists."""
+        return (request.args.get('archive') in ('1', 'true', 'yes')
+                and archive.attach(conn, app.config['ARCHIVE_DATABASE']))
+
+    def _render_row(c):
+        """One admin list row; search results (with their snippet) are not cached."""
+        key = None if c.get('snippet') else (c['id'], c.get('version', 0), c.get('archived', False))
+        html = row_cache.get(key) if key is not None else None
+        if html is None:
+            html = Markup(app.jinja_env.get_template('_complaint_row.html').render(c=c))
+            if key is not None:
+                row_cache.set(key, html)
+        return html
+
     @app.route('/admin/list')
     @admin_required
     def admin_list():
@@ -220,32 +748,92 @@ def create_app():
         status = request.args.get('status', '')
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
-        
+        page_size = request.args.get('per_page', type=int) or app.config['ADMIN_PAGE_SIZE']
+        page_size = max(1, min(page_size, app.config['ADMIN_MAX_PAGE_SIZE']))
+        cursor = _decode_cursor(request.args.get('cursor'))
+        if cursor is not None and isinstance(cursor[0], str):
+            cursor = None  # a bookmarked created_at cursor; start from the top
+        backwards = cursor is not None and request.args.get('dir') == 'prev'
+
         conn = get_db_connection()
-        sql = 'SELECT * FROM complaints WHERE 1=1'
-        params = []
-        
-        if search_query:
-            sql += ' AND (title LIKE ? OR description LIKE ? OR name LIKE ? OR room LIKE ? OR address LIKE ?)'
-            search_pattern = f'%{search_query}%'
-            params.extend([search_pattern] * 5)
-        
-        if status:
-            sql += ' AND status = ?'
-            params.append(status)
-        
-        if date_from:
-            sql += ' AND created_at >= ?'
-            params.append(date_from)
-        
-        if date_to:
-            sql += ' AND created_at <= ?'
-            params.append(date_to + 'T23:59:59')
-        
-        sql += ' ORDER BY created_at DESC'
-        rows = conn.execute(sql, params).fetchall()
-        conn.close()
-        return render_template('admin_list.html', complaints=rows, search_query=search_query)
+        # The archive is queried the same way and the two pages merged
+        schemas = ['main', 'archive'] if _archive_requested(conn) else ['main']
+        counts = {'open': 0, 'in-progress': 0, 'closed': 0}
+        rows = []
+        for schema in schemas:
+            match, from_sql, where, params = _list_filters(search_query, status, date_from, date_to, schema)
+            where_sql = (' WHERE ' + ' AND '.join(where)) if where else ''
+
+            # Summary cards: trigger-maintained counters when only status/date
+            # filters apply, otherwise one GROUP BY over the matching rows.
+            by_status = None
+            if not search_query and (utc_days or not (date_from or date_to)):
+                by_status = counters.totals(conn, date_from, date_to, schema)
+            if by_status is None:
+                by_status = dict(conn.execute(f'SELECT c.status, COUNT(*) FROM {from_sql}{where_sql} GROUP BY c.status', params).fetchall())
+            elif status:
+                by_status = {status: by_status.get(status, 0)}
+            for key, n in by_status.items():
+                counts[key] = counts.get(key, 0) + n
+
+            # Keyset pagination: plain listings walk (created_at, id) newest first,
+            # search results walk (rank, id) best match first.
+            if match:
+                sql = (
+                    "SELECT * FROM (SELECT c.*, snippet(complaints_fts, -1, ?, ?, '…', 12) AS snippet,"
+                    f' complaints_fts.rank AS score FROM {from_sql}{where_sql})'
+                )
+                params = [search.HIGHLIGHT_START, search.HIGHLIGHT_END] + params
+                key_col, id_col, key_field, descending = 'score', 'id', 'score', False
+                page_where = []
+            else:
+                sql = f'SELECT c.*, NULL AS snippet FROM {from_sql}'
+                key_col, id_col, key_field, descending = 'c.created_ts', 'c.id', 'created_ts', True
+                page_where = list(where)
+            if backwards:
+                descending = not descending
+            if cursor is not None:
+                page_where.append(f'({key_col}, {id_col}) {"<" if descending else ">"} (?, ?)')
+                params.extend(cursor)
+            if page_where:
+                sql += ' WHERE ' + ' AND '.join(page_where)
+            order = 'DESC' if descending else 'ASC'
+            sql += f' ORDER BY {key_col} {order}, {id_col} {order} LIMIT ?'
+            params.append(page_size + 1)
+
+            for r in conn.execute(sql, params):
+                d = dict(r)
+                d['snippet'] = search.highlight(d['snippet'])
+                d['archived'] = schema != 'main'
+                rows.append(d)
+        counts['total'] = sum(counts.values())
+        if len(schemas) > 1:
+            # Archive search ranks come from its own index, so the merged
+            # order is only approximately by relevance
+            rows.sort(key=lambda d: (d[key_field] is not None, d[key_field] if d[key_field] is not None else 0, d['id']),
+                      reverse=descending)
+            del rows[page_size + 1:]
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        page_args = request.args.to_dict()
+        page_args.pop('cursor', None)
+        page_args.pop('dir', None)
+        next_url = prev_url = None
+        if rows and (has_more or backwards):
+            last = rows[-1]
+            next_url = url_for('admin_list', **page_args, cursor=_encode_cursor(last[key_field], last['id']))
+        if rows and cursor is not None and (has_more or not backwards):
+            first = rows[0]
+            prev_url = url_for('admin_list', **page_args, cursor=_encode_cursor(first[key_field], first['id']), dir='prev')
+        first_url = url_for('admin_list', **page_args) if cursor is not None else None
+        return render_template(
+            'admin_list.html', complaints=rows, search_query=search_query, counts=counts,
+            next_url=next_url, prev_url=prev_url, first_url=first_url, with_archive=len(schemas) > 1,
+            render_row=_render_row,
+        )
 
     @app.route('/admin/status')
     @admin_required
@@ -257,23 +845,50 @@ def create_app():
                 info['exists'] = True
                 info['size_bytes'] = os.path.getsize(db_path)
                 conn = get_db_connection()
-                cur = conn.execute('SELECT COUNT(*) FROM complaints')
-                info['complaint_count'] = cur.fetchone()[0]
-                conn.close()
+                info['by_status'] = counters.totals(conn)
+                info['complaint_count'] = sum(info['by_status'].values())
+        except Exception:
+            pass
+        info['pool'] = pool.stats()
+        info['group_commit'] = writer.stats() if writer is not None else None
+        info['track_cache'] = track_cache.stats()
+        info['row_cache'] = row_cache.stats()
+        info['rate_limited'] = dict(limiter.rejected) if limiter is not None else None
+        info['archive'] = dict(archiver.stats(), path=app.config['ARCHIVE_DATABASE'],
+                               after_days=app.config['ARCHIVE_AFTER_DAYS'], complaint_count=None)
+        try:
+            conn = get_db_connection()
+            if archive.attach(conn, app.config['ARCHIVE_DATABASE']):
+                info['archive']['complaint_count'] = sum(counters.totals(conn, schema='archive').values())
+                info['archive']['size_bytes'] = os.path.getsize(app.config['ARCHIVE_DATABASE'])
         except Exception:
             pass
+        if slow_queries is not None:
+            info['slow_query_ms'] = app.config['SLOW_QUERY_MS']
+            info['slow_queries'] = slow_queries.entries(get_db_connection())
         return render_template('admin_status.html', info=info)
 
+    @app.route('/admin/slow-queries/clear', methods=['POST'])
+    @admin_required
+    def clear_slow_queries():
+        if slow_queries is not None:
+            slow_queries.clear()
+        flash('Slow query log cleared.', 'info')
+        return redirect(url_for('admin_status'))
+
     @app.route('/admin/complaint/<int:complaint_id>')
     @admin_required
     def view_complaint(complaint_id):
         conn = get_db_connection()
         row = conn.execute('SELECT * FROM complaints WHERE id = ?', (complaint_id,)).fetchone()
-        conn.close()
+        archived = False
+        if not row and archive.attach(conn, app.config['ARCHIVE_DATABASE']):
+            row = conn.execute('SELECT * FROM archive.complaints WHERE id = ?', (complaint_id,)).fetchone()
+            archived = row is not None
         if not row:
             flash('Complaint not found', 'warning')
             return redirect(url_for('admin_list'))
-        return render_template('view_complaint.html', c=dict(row))
+        return render_template('view_complaint.html', c=dict(row, archived=archived))
 
     @app.route('/admin/complaint/<int:complaint_id>/status', methods=['POST'])
     @admin_required
@@ -285,7 +900,7 @@ def create_app():
         conn = get_db_connection()
         conn.execute('UPDATE complaints SET status = ? WHERE id = ?', (new_status, complaint_id))
         conn.commit()
-        conn.close()
+        track_cache.invalidate(complaint_id)
         flash('Status updated', 'success')
         return redirect(request.referrer or url_for('admin_list'))
 
@@ -294,76 +909,174 @@ def create_app():
     def delete_complaint(complaint_id):
         conn = get_db_connection()
         row = conn.execute('SELECT image, video FROM complaints WHERE id = ?', (complaint_id,)).fetchone()
-        if row:
-            # Delete image file
-            if row['image']:
-                try:
-                    img_path = os.path.join(app.config['UPLOAD_FOLDER'], row['image'])
-                    if os.path.exists(img_path):
-                        os.remove(img_path)
-                except Exception:
-                    pass
-            # Delete video file
-            if row.get('video'):
-                try:
-                    vid_path = os.path.join(app.config['UPLOAD_FOLDER'], row['video'])
-                    if os.path.exists(vid_path):
-                        os.remove(vid_path)
-                except Exception:
-                    pass
         conn.execute('DELETE FROM complaints WHERE id = ?', (complaint_id,))
         conn.commit()
-        conn.close()
+        track_cache.invalidate(complaint_id)
+        # Triggers drop the media refcounts; the janitor removes the files
+        if row and (row['image'] or row['video']):
+            janitor.wake()
         flash('Complaint deleted', 'success')
         return redirect(url_for('admin_list'))
 
-    def _build_filtered_query(status=None, date_from=None, date_to=None):
-        sql = 'SELECT id, name, room, title, description, image, video, address, phone, status, created_at FROM complaints'
+    def _bulk_selection():
+        """Targets of a bulk action as (ids, filter_sql, filter_params).
+
+        ``scope=filter`` acts on every complaint matching the admin list filters
+        (passed in the query string); otherwise on the ticked ``ids``.
+        """
+        if request.form.get('scope') == 'filter':
+            _match, from_sql, where, params = _list_filters(
+                request.args.get('search', '').strip(), request.args.get('status', ''),
+                request.args.get('date_from', ''), request.args.get('date_to', ''),
+            )
+            where_sql = (' WHERE ' + ' AND '.join(where)) if where else ''
+            return None, f'SELECT c.id FROM {from_sql}{where_sql}', params
+        ids = {int(v) for v in request.form.getlist('ids') if v.isdigit()}
+        return sorted(ids), None, None
+
+    def _invalidate_tracked(ids):
+        # ids is None for filter-scoped actions; just drop everything then
+        if ids is None:
+            track_cache.clear()
+        else:
+            for i in ids:
+                track_cache.invalidate(i)
+
+    @app.route('/admin/bulk/status', methods=['POST'])
+    @admin_required
+    def bulk_update_status():
+        back = url_for('admin_list', **request.args)
+        new_status = request.form.get('new_status')
+        if new_status not in ('open', 'in-progress', 'closed'):
+            flash('Invalid status', 'danger')
+            return redirect(back)
+        ids, filter_sql, params = _bulk_selection()
+        conn = get_db_connection()
+        # One transaction (one fsync) for the whole batch; rows already in the
+        # target status are skipped so the count reflects real changes.
+        if filter_sql:
+            cur = conn.execute(
+                f'UPDATE complaints SET status = ? WHERE status IS NOT ? AND id IN ({filter_sql})',
+                [new_status, new_status] + params,
+            )
+        else:
+            cur = conn.executemany(
+                'UPDATE complaints SET status = ? WHERE id = ? AND status IS NOT ?',
+                [(new_status, i, new_status) for i in ids],
+            )
+        changed = max(cur.rowcount, 0)
+        conn.commit()
+        _invalidate_tracked(ids)
+        flash(f'Status updated for {changed} complaint{"" if changed == 1 else "s"}', 'success')
+        return redirect(back)
+
+    @app.route('/admin/bulk/delete', methods=['POST'])
+    @admin_required
+    def bulk_delete():
+        back = url_for('admin_list', **request.args)
+        ids, filter_sql, params = _bulk_selection()
+        conn = get_db_connection()
+        if filter_sql:
+            cur = conn.execute(f'DELETE FROM complaints WHERE id IN ({filter_sql})', params)
+        else:
+            cur = conn.executemany('DELETE FROM complaints WHERE id = ?', [(i,) for i in ids])
+        deleted = max(cur.rowcount, 0)
+        conn.commit()
+        _invalidate_tracked(ids)
+        if deleted:
+            janitor.wake()
+        flash(f'Deleted {deleted} complaint{"" if deleted == 1 else "s"}', 'success')
+        return redirect(back)
+
+    def _build_filtered_query(status=None, date_from=None, date_to=None, schema='main'):
+        sql = f'SELECT id, name, room, title, description, image, video, address, phone, status, created_at FROM {schema}.complaints'
         where = []
         params = []
         if status:
             where.append('status = ?')
             params.append(status)
-        if date_from:
-            where.append('created_at >= ?')
-            params.append(date_from)
-        if date_to:
-            where.append('created_at <= ?')
-            params.append(date_to + 'T23:59:59')
+        range_where, range_params = _date_range('created_ts', date_from, date_to)
+        where.extend(range_where)
+        params.extend(range_params)
         if where:
             sql += ' WHERE ' + ' AND '.join(where)
-        sql += ' ORDER BY created_at DESC'
+        sql += ' ORDER BY created_ts DESC'
         return sql, params
 
+    def _export_queries(status, date_from, date_to):
+        """(sql, params) for each database an export reads: live rows, then archived ones."""
+        queries = [_build_filtered_query(status, date_from, date_to)]
+        if _archive_requested(get_db_connection()):
+            queries.append(_build_filtered_query(status, date_from, date_to, schema='archive'))
+        return queries
+
+    def _iter_batches(queries):
+        """Yield query results in fetchmany() batches so exports use bounded memory.
+
+        Must run inside ``stream_with_context`` so the pooled connection stays
+        checked out until the last batch has been sent.
+        """
+        for sql, params in queries:
+            cur = get_db_connection().execute(sql, params)
+            try:
+                while True:
+                    batch = cur.fetchmany(app.config['EXPORT_BATCH_SIZE'])
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                cur.close()
+
+    def _gzip_chunks(chunks):
+        # wbits=31 produces a gzip container rather than a raw zlib stream
+        z = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = z.compress(chunk.encode('utf-8'))
+            if data:
+                yield data
+        yield z.flush()
+
     @app.route('/admin/export')
     @admin_required
     def admin_export():
         status = request.args.get('status')
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
-        sql, params = _build_filtered_query(status, date_from, date_to)
-        conn = get_db_connection()
-        rows = conn.execute(sql, params).fetchall()
-        conn.close()
-        import csv, io
-        si = io.StringIO()
-        w = csv.writer(si)
-        w.writerow(['id', 'name', 'room', 'title', 'description', 'image', 'address', 'phone', 'status', 'created_at'])
-        for r in rows:
-            w.writerow([
-                r['id'],
-                r['name'] or '',
-                r['room'] or '',
-                r['title'] or '',
-                r['description'] or '',
-                r['image'] or '',
-                r['address'] if 'address' in r.keys() else '',
-                r['phone'] if 'phone' in r.keys() else '',
-                r['status'] or '',
-                r['created_at'] or ''
-            ])
-        resp = Response(si.getvalue(), mimetype='text/csv')
-        resp.headers.set('Content-Disposition', 'attachment', filename='complaints.csv')
+        queries = _export_queries(status, date_from, date_to)
+        gzip_requested = request.args.get('gzip') in ('1', 'true', 'yes')
+
+        def generate_csv():
+            si = io.StringIO()
+            w = csv.writer(si)
+            w.writerow(['id', 'name', 'room', 'title', 'description', 'image', 'address', 'phone', 'status', 'created_at'])
+            for batch in _iter_batches(queries):
+                for r in batch:
+                    w.writerow([
+                        r['id'],
+                        r['name'] or '',
+                        r['room'] or '',
+                        r['title'] or '',
+                        r['description'] or '',
+                        r['image'] or '',
+                        r['address'] or '',
+                        r['phone'] or '',
+                        r['status'] or '',
+                        r['created_at'] or ''
+                    ])
+                yield si.getvalue()
+                si.seek(0)
+                si.truncate()
+            if si.tell():
+                yield si.getvalue()
+
+        body = generate_csv()
+        if gzip_requested:
+            body = _gzip_chunks(body)
+            resp = Response(stream_with_context(body), mimetype='application/gzip')
+            resp.headers.set('Content-Disposition', 'attachment', filename='complaints.csv.gz')
+        else:
+            resp = Response(stream_with_context(body), mimetype='text/csv')
+            resp.headers.set('Content-Disposition', 'attachment', filename='complaints.csv')
         return resp
 
     @app.route('/admin/export.json')
@@ -372,20 +1085,72 @@ def create_app():
         status = request.args.get('status')
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
-        sql, params = _build_filtered_query(status, date_from, date_to)
-        conn = get_db_connection()
-        rows = conn.execute(sql, params).fetchall()
-        conn.close()
-        items = []
-        for r in rows:
+        queries = _export_queries(status, date_from, date_to)
+        ndjson = request.args.get('format') == 'ndjson' or (
+            request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+        )
+        gzip_requested = request.args.get('gzip') in ('1', 'true', 'yes')
+
+        def encode(r):
             d = dict(r)
             # ensure optional keys exist as strings
-            if 'address' not in d:
+            if d.get('address') is None:
                 d['address'] = ''
-            if 'phone' not in d:
+            if d.get('phone') is None:
                 d['phone'] = ''
-            items.append(d)
-        return jsonify(items)
+            return app.json.dumps(d, separators=(',', ':'))
+
+        def generate_ndjson():
+            for batch in _iter_batches(queries):
+                yield ''.join(encode(r) + '\n' for r in batch)
+
+        def generate_array():
+            # Emit a JSON array piece by piece instead of serializing one big list
+            sep = '['
+            for batch in _iter_batches(queries):
+                parts = []
+                for r in batch:
+                    parts.append(sep)
+                    parts.append(encode(r))
+                    sep = ','
+                yield ''.join(parts)
+            yield '[]\n' if sep == '[' else ']\n'
+
+        if ndjson:
+            body, mimetype, filename = generate_ndjson(), 'application/x-ndjson', 'complaints.ndjson'
+        else:
+            body, mimetype, filename = generate_array(), 'application/json', 'complaints.json'
+        if gzip_requested:
+            resp = Response(stream_with_context(_gzip_chunks(body)), mimetype='application/gzip')
+            resp.headers.set('Content-Disposition', 'attachment', filename=filename + '.gz')
+        else:
+            resp = Response(stream_with_context(body), mimetype=mimetype)
+        return resp
+
+    @app.route('/admin/metrics')
+    def admin_metrics():
+        token = app.config['METRICS_TOKEN']
+        auth = request.headers.get('Authorization', '')
+        if not session.get('admin') and not (token and hmac.compare_digest(auth.encode(), f'Bearer {token}'.encode())):
+            if auth:
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+            return redirect(url_for('admin_login'))
+        if request_metrics is None:
+            abort(404)
+        pool_stats = pool.stats()
+        cache_stats = track_cache.stats()
+        extra = [
+            ('db_pool_hits_total', 'counter', 'Connections reused from the pool.', pool_stats['hits']),
+            ('db_pool_misses_total', 'counter', 'Connections opened because the pool was empty.', pool_stats['misses']),
+            ('db_pool_idle_connections', 'gauge', 'Idle pooled connections.', pool_stats['idle']),
+            ('track_cache_hits_total', 'counter', 'Track page cache hits.', cache_stats['hits']),
+            ('track_cache_misses_total', 'counter', 'Track page cache misses.', cache_stats['misses']),
+            ('track_cache_entries', 'gauge', 'Track pages currently cached.', cache_stats['size']),
+        ]
+        if limiter is not None:
+            extra.append(('rate_limited_requests_total', 'counter', 'Requests refused by the rate limiter.',
+                          sum(limiter.rejected.values())))
+        return Response(request_metrics.render(extra), content_type=metrics.CONTENT_TYPE)
 
     @app.route('/admin/check_password', methods=['GET', 'POST'])
     def admin_check_password():
@@ -403,6 +1168,8 @@ def create_app():
 
     @app.errorhandler(CSRFError)
     def handle_csrf_error(e):
+        if request.endpoint in ('create_video_upload', 'video_upload'):
+            return _upload_response({'error': e.description}, 400)
         flash('Security token missing or invalid. Please retry the action.', 'danger')
         return redirect(request.referrer or url_for('submit'))
 
@@ -0,0 +1,243 @@
+"""Hot/cold split: old closed complaints move to a separate archive database.
+
+The archive is its own SQLite file with the same ``complaints`` columns (plus
+``archived_at``), its own FTS index and status/day counters, kept up to date
+by triggers inside that file. It is attached to a connection as schema
+``archive`` only when a request asks for it, so everyday queries, counts and
+exports only ever touch the live rows.
+
+Rows are moved in batches: first copied into the archive and committed, then
+deleted from the live table in a second transaction. In WAL mode a
+transaction spanning two attached files is only atomic per file, so this
+order means a crash can leave a row in both databases (the next run finishes
+the move) but never in neither.
+"""
+import calendar
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import counters
+import db
+import search
+
+log = logging.getLogger(__name__)
+
+SCHEMA = 'archive'
+
+COLUMNS = ('id', 'name', 'room', 'title', 'description', 'image', 'video', 'address', 'phone',
+           'access_code', 'status', 'created_at', 'created_ts')
+
+_cols = ', '.join(COLUMNS)
+
+ARCHIVE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS complaints (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        room TEXT,
+        title TEXT,
+        description TEXT,
+        image TEXT,
+        video TEXT,
+        address TEXT,
+        phone TEXT,
+        access_code TEXT,
+        status TEXT,
+        created_at TEXT,
+        archived_at TEXT,
+        created_ts INTEGER
+    )
+    ''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_complaints_access_code ON complaints(access_code)',
+    'CREATE INDEX IF NOT EXISTS idx_complaints_status_created_ts ON complaints(status, created_ts)',
+    'CREATE INDEX IF NOT EXISTS idx_complaints_created_ts ON complaints(created_ts)',
+]
+
+# Lives in the main database: access codes of archived complaints stay taken,
+# so /track by code can never match a live and an archived complaint. The
+# RAISE is an IntegrityError, which makes the insert draw a new code.
+MAIN_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS archived_codes (
+        access_code TEXT PRIMARY KEY
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS complaints_archived_code_bi BEFORE INSERT ON complaints
+    WHEN new.access_code IS NOT NULL
+        AND EXISTS (SELECT 1 FROM archived_codes WHERE access_code = new.access_code)
+    BEGIN
+        SELECT RAISE(ABORT, 'access_code belongs to an archived complaint');
+    END
+    ''',
+]
+
+
+def ensure_main_schema(conn):
+    for stmt in MAIN_SCHEMA:
+        conn.execute(stmt)
+
+
+def ensure_schema(path):
+    """Create the archive database at ``path`` (or bring its schema up to date)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = db.connect(path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(ARCHIVE_SCHEMA[0])
+        # Archives made before created_ts existed
+        if 'created_ts' not in {r[1] for r in conn.execute('PRAGMA table_info(complaints)')}:
+            conn.execute('ALTER TABLE complaints ADD COLUMN created_ts INTEGER')
+            conn.execute("UPDATE complaints SET created_ts ="
+                         " COALESCE(CAST(strftime('%s', substr(created_at, 1, 19)) AS INTEGER), 0)")
+            conn.execute('DROP INDEX IF EXISTS idx_complaints_status_created')
+            conn.execute('DROP INDEX IF EXISTS idx_complaints_created')
+        for stmt in ARCHIVE_SCHEMA[1:]:
+            conn.execute(stmt)
+        search.ensure_index(conn)
+        counters.ensure_schema(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def is_attached(conn):
+    return any(row[1] == SCHEMA for row in conn.execute('PRAGMA database_list'))
+
+
+def attach(conn, path):
+    """Attach ``path`` as schema ``archive`` if it exists; returns whether it is attached."""
+    if is_attached(conn):
+        return True
+    if conn.in_transaction or not os.path.exists(path):
+        return False
+    conn.execute(f'ATTACH DATABASE ? AS {SCHEMA}', (path,))
+    return True
+
+
+def cutoff(older_than_days, now=None):
+    """Unix time ``older_than_days`` days before ``now`` (UTC)."""
+    return calendar.timegm(((now or datetime.utcnow()) - timedelta(days=older_than_days)).utctimetuple())
+
+
+def archive_batch(conn, before, batch_size=500):
+    """Move up to ``batch_size`` closed complaints created before ``before``.
+
+    ``conn`` must have the archive attached. Returns the number of rows moved.
+    """
+    ids = [r[0] for r in conn.execute(
+        "SELECT id FROM main.complaints WHERE status = 'closed' AND created_ts < ? ORDER BY created_ts LIMIT ?",
+        (before, batch_size),
+    )]
+    if not ids:
+        return 0
+    marks = ', '.join('?' * len(ids))
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Ignores rows a crashed earlier run already copied
+        conn.execute(
+            f'INSERT OR IGNORE INTO {SCHEMA}.complaints ({_cols}, archived_at)'
+            f' SELECT {_cols}, ? FROM main.complaints WHERE id IN ({marks})',
+            [datetime.utcnow().isoformat()] + ids,
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # The delete triggers drop one media reference per image/video, but
+        # the archived copy still shows the files: put the references back.
+        conn.execute(
+            f'''
+            INSERT INTO main.media(path, refcount)
+            SELECT path, COUNT(*) FROM (
+                SELECT image AS path FROM main.complaints WHERE id IN ({marks}) AND image IS NOT NULL
+                UNION ALL
+                SELECT video FROM main.complaints WHERE id IN ({marks}) AND video IS NOT NULL
+            ) GROUP BY path
+            ON CONFLICT(path) DO UPDATE SET refcount = refcount + excluded.refcount
+            ''',
+            ids + ids,
+        )
+        conn.execute(
+            f'INSERT OR IGNORE INTO main.archived_codes(access_code) SELECT access_code FROM main.complaints'
+            f' WHERE id IN ({marks}) AND access_code IS NOT NULL',
+            ids,
+        )
+        cur = conn.execute(
+            f'DELETE FROM main.complaints WHERE id IN ({marks}) AND id IN (SELECT id FROM {SCHEMA}.complaints)',
+            ids,
+        )
+        moved = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return moved
+
+
+def run(conn, path, older_than_days, batch_size=500, limit=None, progress=None):
+    """Archive every closed complaint older than ``older_than_days``; returns the count.
+
+    Creates and attaches the archive at ``path`` as needed. Each batch is
+    its own pair of short transactions, so the app keeps serving (and
+    writing) while a large backlog is moved.
+    """
+    ensure_schema(path)
+    if not attach(conn, path):
+        raise sqlite3.OperationalError(f'cannot attach archive {path}')
+    before = cutoff(older_than_days)
+    moved = 0
+    while limit is None or moved < limit:
+        n = archive_batch(conn, before, batch_size if limit is None else min(batch_size, limit - moved))
+        moved += n
+        if progress is not None and n:
+            progress(moved)
+        if n < batch_size:
+            break
+    return moved
+
+
+class ArchiveJob:
+    """Background thread that runs :func:`run` every ``interval`` seconds."""
+
+    def __init__(self, pool, path, older_than_days, interval=3600, batch_size=500):
+        self.pool = pool
+        self.path = path
+        self.older_than_days = older_than_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.moved = 0
+        self.last_run = None
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='archive-job', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                log.exception('archive pass failed')
+
+    def run_once(self):
+        conn = self.pool.acquire()
+        try:
+            self.moved += run(conn, self.path, self.older_than_days, self.batch_size)
+            self.last_run = datetime.utcnow().isoformat(timespec='seconds')
+        finally:
+            self.pool.release(conn)
+
+    def stats(self):
+        return {'interval': self.interval, 'moved': self.moved, 'last_run': self.last_run}
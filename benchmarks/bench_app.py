@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the hot request paths, driven through Flask's test client.
+
+Usage:
+  python benchmarks/bench_app.py [--sizes 1000 100000 1000000] [--requests 200]
+                                 [--out bench-results/run.json]
+  python benchmarks/bench_app.py --compare old.json new.json
+
+For every database size a seeded copy is created once under --data-dir and
+reused by later runs. Each endpoint is timed for --requests iterations
+(latency percentiles), then run a few more times under tracemalloc to record
+peak Python memory. Results are written as JSON together with the git commit,
+so runs from different commits can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+import seed  # noqa: E402
+
+SEED_NOW = datetime(2024, 1, 1)
+
+
+def seed_db(path, count):
+    """Fill a fresh database at ``path`` with ``count`` synthetic complaints."""
+    conn = db.connect(path)
+    migrations.migrate(conn)
+    seed.seed(conn, count, now=SEED_NOW, random_seed=count)
+    conn.close()
+
+
+def dataset(data_dir, size):
+    """Path to a seeded database of ``size`` rows, seeding it on first use."""
+    path = os.path.join(data_dir, f'seed-{size}.db')
+    if not os.path.exists(path):
+        tmp = path + '.partial'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(tmp + suffix):
+                os.remove(tmp + suffix)
+        t0 = time.perf_counter()
+        seed_db(tmp, size)
+        os.replace(tmp, path)
+        print(f'  seeded {size} rows in {time.perf_counter() - t0:.1f}s', file=sys.stderr)
+    return path
+
+
+def scenarios(db_path, size):
+    """(name, method, url, form data) for each benchmarked request."""
+    mid = max(1, size // 2)
+    conn = db.connect(db_path)
+    code = conn.execute('SELECT access_code FROM complaints WHERE id = ?', (mid,)).fetchone()[0]
+    conn.close()
+    return [
+        ('submit', 'POST', '/submit', lambda i: {
+            'name': 'Bench', 'room': '101', 'title': f'Bench {i}', 'description': 'benchmark',
+            'address': 'Block A', 'phone': '555-0000'}),
+        ('track_by_id', 'POST', '/track', lambda i: {'complaint_id': str(mid)}),
+        ('track_by_code', 'POST', '/track', lambda i: {'access_code': code}),
+        ('admin_list', 'GET', '/admin/list', None),
+        ('admin_list_status', 'GET', '/admin/list?status=open&date_from=2023-10-01&date_to=2023-12-31', None),
+        ('admin_list_search', 'GET', '/admin/list?search=radiator%20cold', None),
+        ('admin_export', 'GET', '/admin/export?status=closed', None),
+        ('admin_export_json', 'GET', '/admin/export.json?status=closed', None),
+    ]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_size(size, data_dir, requests, export_requests, mem_runs):
+    from app import create_app
+
+    work = tempfile.mkdtemp(prefix='bench-')
+    try:
+        # Work on a copy so submit() doesn't grow the cached dataset
+        db_path = os.path.join(work, 'complaints.db')
+        shutil.copyfile(dataset(data_dir, size), db_path)
+        app = create_app({
+            'DATABASE': db_path,
+            'UPLOAD_FOLDER': os.path.join(work, 'uploads'),
+            'WTF_CSRF_ENABLED': False,
+            'RATE_LIMIT_ENABLED': False,
+            'TRACK_CACHE_SIZE': 0,
+            'THUMBNAIL_WORKERS': 0,
+        })
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['admin'] = True
+
+        results = {}
+        for name, method, url, form in scenarios(db_path, size):
+            n = export_requests if name.startswith('admin_export') else requests
+
+            def call(i):
+                data = form(i) if form else None
+                # Unbuffered, so peak memory reflects the app rather than a copy of the body
+                resp = client.open(url, method=method, data=data, buffered=False)
+                try:
+                    if resp.status_code >= 400:
+                        raise RuntimeError(f'{name}: HTTP {resp.status_code}')
+                    return sum(len(chunk) for chunk in resp.response)
+                finally:
+                    resp.close()
+
+            call(0)  # warm up caches and the connection pool
+            timings = []
+            size_bytes = 0
+            for i in range(n):
+                t0 = time.perf_counter()
+                size_bytes = call(i + 1)
+                timings.append((time.perf_counter() - t0) * 1000.0)
+            timings.sort()
+
+            tracemalloc.start()
+            for i in range(mem_runs):
+                call(n + i + 1)
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                'requests': n,
+                'mean_ms': statistics.fmean(timings),
+                'p50_ms': percentile(timings, 50),
+                'p90_ms': percentile(timings, 90),
+                'p99_ms': percentile(timings, 99),
+                'max_ms': timings[-1],
+                'response_bytes': size_bytes,
+                'peak_mem_kb': peak / 1024.0,
+            }
+            r = results[name]
+            print(f'  {name:<20} p50 {r["p50_ms"]:8.2f} ms  p99 {r["p99_ms"]:8.2f} ms  '
+                  f'peak {r["peak_mem_kb"]:9.1f} KiB  {size_bytes} B', file=sys.stderr)
+        for ext in app.extensions.values():
+            if hasattr(ext, 'close_all'):
+                ext.close_all()
+        return results
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old.get("commit")} -> {new.get("commit")}')
+    for size, endpoints in new['sizes'].items():
+        print(f'size {size}')
+        for name, r in endpoints.items():
+            before = old['sizes'].get(size, {}).get(name)
+            if not before:
+                print(f'  {name:<20} (new)')
+                continue
+            parts = []
+            for key in ('p50_ms', 'p99_ms', 'peak_mem_kb'):
+                a, b = before[key], r[key]
+                change = ((b - a) / a * 100.0) if a else 0.0
+                parts.append(f'{key} {a:.2f} -> {b:.2f} ({change:+.0f}%)')
+            print(f'  {name:<20} ' + '  '.join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--requests', type=int, default=200, help='timed iterations per endpoint')
+    parser.add_argument('--export-requests', type=int, default=5, help='timed iterations per export endpoint')
+    parser.add_argument('--mem-runs', type=int, default=3, help='iterations traced for peak memory')
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, '.bench-data'))
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'sizes': {},
+    }
+    for size in args.sizes:
+        print(f'size {size}', file=sys.stderr)
+        report['sizes'][str(size)] = run_size(size, args.data_dir, args.requests, args.export_requests, args.mem_runs)
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            f.write(out + '\n')
+        print(f'wrote {args.out}', file=sys.stderr)
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
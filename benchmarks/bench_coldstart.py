@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark: import time, create_app() and the first request.
+
+Usage:
+  python benchmarks/bench_coldstart.py [--runs 15] [--out bench-results/cold.json]
+  python benchmarks/bench_coldstart.py --compare old.json new.json
+
+Every run is a fresh interpreter, as on a serverless cold start. Scenarios
+cover an empty DATA_ROOT (a new /tmp on Vercel) and an already-migrated
+database, each with FAST_BOOT off and on. The first request is GET /submit,
+which opens the database (under FAST_BOOT) and compiles its template.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, time
+t0 = time.perf_counter()
+import app as appmod
+t1 = time.perf_counter()
+application = appmod.create_app()
+t2 = time.perf_counter()
+resp = application.test_client().get('/submit', buffered=True)
+t3 = time.perf_counter()
+assert resp.status_code == 200, resp.status_code
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000,
+                  'first_request_ms': (t3 - t2) * 1000}))
+'''
+
+METRICS = ('import_ms', 'create_app_ms', 'first_request_ms', 'process_ms')
+
+
+def run_once(data_root, fast_boot):
+    env = dict(os.environ, DATA_ROOT=data_root, FAST_BOOT='1' if fast_boot else '0')
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def run_scenario(existing_db, fast_boot, runs):
+    work = tempfile.mkdtemp(prefix='coldstart-')
+    try:
+        if existing_db:
+            run_once(work, fast_boot=False)  # create and migrate the database once
+        samples = []
+        for _ in range(runs):
+            root = work
+            if not existing_db:
+                root = tempfile.mkdtemp(dir=work)
+            samples.append(run_once(root, fast_boot))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    summary = {}
+    for metric in METRICS:
+        values = sorted(s[metric] for s in samples)
+        summary[metric] = {
+            'min': values[0],
+            'p50': statistics.median(values),
+            'p90': values[min(len(values) - 1, int(len(values) * 0.9))],
+        }
+    return summary
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old.get("commit")} -> {new.get("commit")} (p50 ms)')
+    for name, metrics in new['scenarios'].items():
+        before = old['scenarios'].get(name)
+        parts = []
+        for metric in METRICS:
+            b = metrics[metric]['p50']
+            if before is None:
+                parts.append(f'{metric} {b:.1f}')
+                continue
+            a = before[metric]['p50']
+            change = ((b - a) / a * 100.0) if a else 0.0
+            parts.append(f'{metric} {a:.1f} -> {b:.1f} ({change:+.0f}%)')
+        print(f'  {name:<24} ' + '  '.join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=15, help='cold starts per scenario')
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    warmup = tempfile.mkdtemp(prefix='coldstart-')
+    run_once(warmup, fast_boot=False)  # write .pyc files first
+    shutil.rmtree(warmup, ignore_errors=True)
+    report = {
+        'commit': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                 text=True).stdout.strip() or None,
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'scenarios': {},
+    }
+    for existing_db in (False, True):
+        for fast_boot in (False, True):
+            name = f'{"existing" if existing_db else "empty"}_db{"_fast_boot" if fast_boot else ""}'
+            summary = run_scenario(existing_db, fast_boot, args.runs)
+            report['scenarios'][name] = summary
+            print(f'{name:<24} ' + '  '.join(f'{m} {summary[m]["p50"]:7.1f}' for m in METRICS), file=sys.stderr)
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            f.write(out + '\n')
+        print(f'wrote {args.out}', file=sys.stderr)
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
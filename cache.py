@@ -0,0 +1,100 @@
+"""Small in-process caches.
+
+Each worker process has its own copy, so entries carry a TTL: an update made
+through another worker is visible here after at most ``ttl`` seconds, and
+updates made through this worker invalidate the entry immediately.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL and tag-based invalidation.
+
+    Tags let one logical object be cached under several keys (e.g. a
+    complaint looked up by id or by access code) and dropped in one call.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, tag):
+        with self._lock:
+            keys = self._tags.pop(tag, ())
+            for key in list(keys):
+                self._drop(key)
+            if keys:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._stats['invalidations'] += 1
+
+    def _drop(self, key):
+        _expires, _value, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            info = dict(self._stats)
+            info['size'] = len(self._data)
+        lookups = info['hits'] + info['misses']
+        info['maxsize'] = self.maxsize
+        info['hit_rate'] = (info['hits'] / lookups) if lookups else None
+        return info
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """Compiled templates on disk, shared by worker processes and restarts.
+
+    Jinja checks each entry against the template source, so edits are picked
+    up. A missing or read-only directory only means nothing is persisted.
+    """
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
@@ -0,0 +1,153 @@
+"""gzip/brotli compression for responses and precompressed static files.
+
+Dynamic responses are compressed in an ``after_request`` hook when the
+client accepts it, the content type is textual and the body is big enough.
+Rendered HTML is the exception: it carries the CSRF token next to input
+echoed from the request (``search=``), and compressing the two together
+lets an attacker recover the token from response sizes (BREACH).
+Streamed bodies (the exports) are compressed chunk by chunk and flushed after
+each one, so they still reach the client incrementally. Static files are
+compressed ahead of time by ``manage.py compress-static`` and the ``.br`` or
+``.gz`` copy is sent as is.
+
+Brotli is optional: without the ``brotli`` package only gzip is offered.
+"""
+import gzip
+import os
+import zlib
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset((
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'application/javascript',
+    'application/json', 'application/x-ndjson', 'application/xml', 'image/svg+xml',
+))
+
+# What compress_response() will touch: no HTML, see the module docstring
+DYNAMIC_TYPES = COMPRESSIBLE_TYPES - {'text/html'}
+
+# Content-Encoding -> file suffix for precompressed copies, best first
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Best encoding the client accepts (a Werkzeug ``Accept`` object), or None."""
+    return accept_encodings.best_match(encodings()) or None
+
+
+def _compressor(encoding, level):
+    if encoding == 'br':
+        # Quality 4-5 is the usual trade-off for on-the-fly brotli
+        c = brotli.Compressor(quality=level)
+        return c.process, c.flush, c.finish
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return z.compress, lambda: z.flush(zlib.Z_SYNC_FLUSH), z.flush
+
+
+def compress_bytes(data, encoding, level):
+    process, _flush, finish = _compressor(encoding, level)
+    return process(data) + finish()
+
+
+def compress_stream(chunks, encoding, level):
+    """Compress an iterable of bytes/str chunks, flushing after each one."""
+    process, flush, finish = _compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response, encoding, gzip_level=6, brotli_quality=4, min_size=500,
+                      types=DYNAMIC_TYPES):
+    """Compress a Flask response in place if it is worth it; returns the response."""
+    if (response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.mimetype not in types):
+        return response
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+    level = brotli_quality if encoding == 'br' else gzip_level
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress_bytes(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def precompressed_variant(folder, filename, accept_encodings):
+    """(path relative to ``folder``, encoding) of an up-to-date precompressed copy, or None."""
+    path = safe_join(folder, filename)
+    if path is None:
+        return None
+    try:
+        source_mtime = os.stat(path).st_mtime
+    except (OSError, ValueError):
+        return None
+    for encoding, suffix in STATIC_ENCODINGS:
+        if not accept_encodings[encoding]:
+            continue
+        try:
+            if os.stat(path + suffix).st_mtime >= source_mtime:
+                return filename + suffix, encoding
+        except OSError:
+            continue
+    return None
+
+
+def precompress_folder(folder, min_size=256):
+    """Write ``.gz`` (and ``.br``) copies of compressible files; returns [(path, encoding, size)].
+
+    Copies that are not smaller than the original are not kept.
+    """
+    import mimetypes
+
+    written = []
+    for root, _dirs, files in os.walk(folder):
+        for name in files:
+            if name.endswith(tuple(s for _e, s in STATIC_ENCODINGS)):
+                continue
+            path = os.path.join(root, name)
+            if mimetypes.guess_type(name)[0] not in COMPRESSIBLE_TYPES or os.path.getsize(path) < min_size:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            variants = [('gzip', '.gz', gzip.compress(data, 9, mtime=0))]
+            if brotli is not None:
+                variants.append(('br', '.br', brotli.compress(data, quality=11)))
+            for encoding, suffix, body in variants:
+                if len(body) >= len(data):
+                    continue
+                tmp = path + suffix + '.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(body)
+                os.replace(tmp, path + suffix)
+                written.append((os.path.relpath(path, folder), encoding, len(body)))
+    return written
@@ -0,0 +1,124 @@
+"""Complaint totals by status and by day, maintained by SQLite triggers.
+
+``complaint_counts`` holds one row per (day, status) plus all-time rows with
+``day = '*'``, so the dashboard numbers are a handful of primary-key reads
+instead of a COUNT(*) over the whole table.
+"""
+import re
+
+ALL_DAYS = '*'
+
+_DAY = "COALESCE(substr({row}.created_at, 1, 10), '')"
+_STATUS = "COALESCE({row}.status, '')"
+
+
+def _bump(row, delta):
+    day = _DAY.format(row=row)
+    status = _STATUS.format(row=row)
+    return (
+        f"INSERT INTO complaint_counts(day, status, n) VALUES ({day}, {status}, {delta}), ('{ALL_DAYS}', {status}, {delta})"
+        f" ON CONFLICT(day, status) DO UPDATE SET n = n + ({delta});"
+    )
+
+
+COUNTERS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS complaint_counts (
+        day TEXT NOT NULL,
+        status TEXT NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, status)
+    ) WITHOUT ROWID
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS complaints_counts_ai AFTER INSERT ON complaints BEGIN
+        {_bump('new', 1)}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS complaints_counts_ad AFTER DELETE ON complaints BEGIN
+        {_bump('old', -1)}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS complaints_counts_au AFTER UPDATE OF status, created_at ON complaints
+    WHEN old.status IS NOT new.status OR {_DAY.format(row='old')} IS NOT {_DAY.format(row='new')}
+    BEGIN
+        {_bump('old', -1)}
+        {_bump('new', 1)}
+    END
+    ''',
+]
+
+_ACTUAL_SQL = f'''
+    SELECT day, status, COUNT(*) FROM (
+        SELECT {_DAY.format(row='complaints')} AS day, {_STATUS.format(row='complaints')} AS status FROM complaints
+    ) GROUP BY day, status
+    UNION ALL
+    SELECT '{ALL_DAYS}', {_STATUS.format(row='complaints')}, COUNT(*) FROM complaints GROUP BY 2
+'''
+
+_DAY_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def ensure_schema(conn):
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'complaint_counts'"
+    ).fetchone() is not None
+    for stmt in COUNTERS_SCHEMA:
+        conn.execute(stmt)
+    if not existed:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """Recompute every counter from the complaints table (caller commits)."""
+    conn.execute('DELETE FROM complaint_counts')
+    conn.execute(f'INSERT INTO complaint_counts(day, status, n) {_ACTUAL_SQL}')
+
+
+def add_rows(conn, after_id):
+    """Count complaints with id > ``after_id`` that were inserted without the trigger."""
+    day, status = _DAY.format(row='complaints'), _STATUS.format(row='complaints')
+    conn.execute(
+        f'''
+        INSERT INTO complaint_counts(day, status, n)
+        SELECT day, status, n FROM (
+            SELECT {day} AS day, {status} AS status, COUNT(*) AS n FROM complaints WHERE id > ?1 GROUP BY 1, 2
+            UNION ALL
+            SELECT '{ALL_DAYS}', {status}, COUNT(*) FROM complaints WHERE id > ?1 GROUP BY 2
+        ) WHERE true
+        ON CONFLICT(day, status) DO UPDATE SET n = n + excluded.n
+        ''',
+        (after_id,),
+    )
+
+
+def check(conn):
+    """Return [(day, status, stored, actual)] for every counter that is off."""
+    actual = {(d, s): n for d, s, n in conn.execute(_ACTUAL_SQL)}
+    stored = {(d, s): n for d, s, n in conn.execute('SELECT day, status, n FROM complaint_counts')}
+    diffs = []
+    for key in sorted(set(actual) | set(stored)):
+        a, b = actual.get(key, 0), stored.get(key, 0)
+        if a != b:
+            diffs.append((key[0], key[1], b, a))
+    return diffs
+
+
+def totals(conn, date_from=None, date_to=None, schema='main'):
+    """Counts by status, all-time or for an inclusive YYYY-MM-DD day range.
+
+    Returns None when the range isn't in day form, so callers can fall back
+    to counting rows. ``schema`` selects an attached database (the archive).
+    """
+    if not date_from and not date_to:
+        rows = conn.execute(f'SELECT status, n FROM {schema}.complaint_counts WHERE day = ?', (ALL_DAYS,))
+    else:
+        if any(d and not _DAY_RE.match(d) for d in (date_from, date_to)):
+            return None
+        rows = conn.execute(
+            f"SELECT status, SUM(n) FROM {schema}.complaint_counts WHERE day != ? AND day != '' AND day >= ? AND day <= ? GROUP BY status",
+            (ALL_DAYS, date_from or '0000-00-00', date_to or '9999-99-99'),
+        )
+    return {status: n for status, n in rows if n}
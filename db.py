@@ -0,0 +1,349 @@
+"""SQLite connection handling shared by the web app and the CLI helpers.
+
+Connections are expensive to open (file open, PRAGMA setup, schema cache
+warm-up), so the app keeps a small pool of them and hands one out per
+application context instead of reconnecting on every call.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_CACHE_SIZE_KB = 16384
+DEFAULT_MMAP_SIZE = 128 * 1024 * 1024
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that charges the time spent in SQLite to its connection.
+
+    execute() and executemany() are timed, and so is each fetchmany() batch,
+    which is how exports stream their rows. fetchone(), fetchall() and
+    iteration are left on the C fast path; for the small results they
+    serve, execute() already does most of the work. A statement is
+    reported to the connection's ``statement_hook`` when fetchmany() runs
+    out of rows, when the cursor is reused or closed, or else by
+    :meth:`TimedConnection.finish_statements` when the connection is
+    handed back. Nothing waits for the cursor to be garbage collected.
+    """
+
+    _statement = None  # [sql, parameters, seconds] until finished
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            self.connection._report(statement)
+
+    def execute(self, sql, parameters=()):
+        conn = self.connection
+        if self._statement is not None:
+            self._finish()
+        conn.db_queries += 1
+        started = time.perf_counter()
+        try:
+            _execute(self, sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            conn.db_time += elapsed
+        if self.description is None:
+            if conn.statement_hook is not None:
+                conn.statement_hook(sql, parameters, elapsed)
+        else:
+            self._statement = statement = [sql, parameters, elapsed]
+            conn._open_statements[id(statement)] = statement
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        conn = self.connection
+        if self._statement is not None:
+            self._finish()
+        conn.db_queries += 1
+        started = time.perf_counter()
+        try:
+            _executemany(self, sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            conn.db_time += elapsed
+        if conn.statement_hook is not None:
+            conn.statement_hook(sql, None, elapsed)
+        return self
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = _fetchmany(self, size)
+        elapsed = time.perf_counter() - started
+        self.connection.db_time += elapsed
+        if self._statement is not None:
+            self._statement[2] += elapsed
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+_execute = sqlite3.Cursor.execute
+_executemany = sqlite3.Cursor.executemany
+_fetchmany = sqlite3.Cursor.fetchmany
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection that keeps a running total of statements and time in SQLite.
+
+    Call :meth:`finish_statements` and :meth:`reset_timing` when the
+    connection changes hands (:meth:`ConnectionPool.release` does the
+    former). Set ``statement_hook`` to ``f(sql, parameters, seconds)`` to
+    see every statement as it finishes.
+    """
+
+    statement_hook = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reset_timing()
+
+    def reset_timing(self):
+        self.db_time = 0.0
+        self.db_queries = 0
+        self._open_statements = {}  # id -> [sql, parameters, seconds]
+
+    def _report(self, statement):
+        if self._open_statements.pop(id(statement), None) is None:
+            return  # already reported
+        if self.statement_hook is not None:
+            self.statement_hook(*statement)
+
+    def finish_statements(self):
+        """Report statements whose cursors were iterated or left unfinished."""
+        for statement in list(self._open_statements.values()):
+            self._report(statement)
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.db_time += time.perf_counter() - started
+
+
+def connect(path, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS, cache_size_kb=DEFAULT_CACHE_SIZE_KB,
+            mmap_size=DEFAULT_MMAP_SIZE, timed=False, statement_hook=None):
+    """Open a tuned connection: WAL journal, NORMAL sync, bigger page cache.
+
+    With ``timed`` (implied by ``statement_hook``) the connection is a
+    :class:`TimedConnection`.
+    """
+    timed = timed or statement_hook is not None
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000.0, check_same_thread=False,
+                           factory=TimedConnection if timed else sqlite3.Connection)
+    if statement_hook is not None:
+        conn.statement_hook = statement_hook
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f'PRAGMA cache_size=-{int(cache_size_kb)}')
+    conn.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA foreign_keys=ON')
+    if timed:
+        conn.finish_statements()  # the PRAGMAs that answer with a row
+    return conn
+
+
+class ConnectionPool:
+    """Bounded LIFO pool of SQLite connections to a single database file.
+
+    A connection is only ever used by one thread at a time (the one that
+    acquired it), which is what makes ``check_same_thread=False`` safe here.
+    """
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE, **connect_kwargs):
+        self.path = path
+        self.size = size
+        self.connect_kwargs = connect_kwargs
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'opened': 0, 'discarded': 0}
+
+    def _bump(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            self._bump('misses')
+            self._bump('opened')
+            return connect(self.path, **self.connect_kwargs)
+        self._bump('hits')
+        return conn
+
+    def release(self, conn):
+        if isinstance(conn, TimedConnection):
+            conn.finish_statements()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection; don't hand it to the next request
+            self._discard(conn)
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    def _discard(self, conn):
+        self._bump('discarded')
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            info = dict(self._stats)
+        total = info['hits'] + info['misses']
+        info['idle'] = self._idle.qsize()
+        info['size'] = self.size
+        info['hit_rate'] = (info['hits'] / total) if total else None
+        return info
+
+
+class GroupCommitWriter:
+    """Single writer thread that batches jobs from many threads into one commit.
+
+    Each job is a callable taking a connection; it runs inside its own
+    SAVEPOINT so a failing job does not spoil the rest of the batch. The
+    transaction is committed once per batch, so a burst of N submissions costs
+    one fsync instead of N and never contends for the write lock.
+    """
+
+    def __init__(self, path, window_ms=2, max_batch=256, **connect_kwargs):
+        self.path = path
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.connect_kwargs = connect_kwargs
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'jobs': 0, 'batches': 0, 'largest_batch': 0, 'failed': 0}
+
+    def submit(self, job, timeout=10):
+        """Run ``job(conn)`` in the next batch and return its result once committed.
+
+        On ``TimeoutError`` the job has not run and never will; a job
+        already in a batch when the timeout hits is waited for instead.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # Opened here so a connection error reaches the caller
+                conn = connect(self.path, **self.connect_kwargs)
+                conn.isolation_level = None  # we issue BEGIN/COMMIT ourselves
+                self._thread = threading.Thread(target=self._run, args=(conn,), name='group-commit', daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((job, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise
+        return future.result()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, conn):
+        batch = []
+        try:
+            while True:
+                # Jobs whose submitter timed out (cancelled futures) are dropped
+                batch = [(job, future) for job, future in self._next_batch()
+                         if future.set_running_or_notify_cancel()]
+                if batch:
+                    self._commit(conn, batch)
+                    if isinstance(conn, TimedConnection):
+                        conn.finish_statements()
+        except BaseException as e:
+            # submit() starts a new thread, with a new connection, next time
+            log.exception('group commit writer stopped')
+            for _job, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            conn.close()
+
+    def _commit(self, conn, batch):
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for job, future in batch:
+                conn.execute('SAVEPOINT job')
+                try:
+                    results.append((future, job(conn), None))
+                    conn.execute('RELEASE job')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    conn.execute('RELEASE job')
+                    results.append((future, None, e))
+            conn.execute('COMMIT')
+        except Exception as e:
+            for _job, future in batch:
+                future.set_exception(e)
+            if conn.in_transaction:
+                # If even this fails the connection is unusable: let the
+                # thread end so the next submit() reconnects
+                conn.execute('ROLLBACK')
+            return
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['jobs'] += len(batch)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['failed'] += sum(1 for r in results if r[2] is not None)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            info = dict(self._stats)
+        info['avg_batch'] = (info['jobs'] / info['batches']) if info['batches'] else None
+        return info
@@ -1,31 +1,24 @@
 """Utility: initialize the SQLite DB for the hostel complaints app.
 
-Run with: `python init_db.py` to create `instance/complaints.db` and the table.
+Run with: `python init_db.py` to create `instance/complaints.db` and apply any
+pending schema migrations (the same ones the app runs on start-up).
 """
 import os
-import sqlite3
+
+import db
+import migrations
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'instance', 'complaints.db')
+DATA_ROOT = os.environ.get('DATA_ROOT', BASE_DIR)
+DB_PATH = os.path.join(DATA_ROOT, 'instance', 'complaints.db')
 
 def ensure_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute('''
-    CREATE TABLE IF NOT EXISTS complaints (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        room TEXT,
-        title TEXT,
-        description TEXT,
-        image TEXT,
-        status TEXT DEFAULT 'open',
-        created_at TEXT
-    )
-    ''')
-    conn.commit()
+    conn = db.connect(DB_PATH)
+    before = migrations.current_version(conn)
+    after = migrations.migrate(conn)
     conn.close()
-    print('Initialized DB at', DB_PATH)
+    print('Initialized DB at', DB_PATH, f'(schema v{before} -> v{after})')
 
 if __name__ == '__main__':
     ensure_db()
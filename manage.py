@@ -3,8 +3,20 @@
 
 Usage:
   python manage.py set-admin-password <password>
+  python manage.py gc-uploads [--dry-run] [--min-age SECONDS]
+  python manage.py check-counters [--rebuild]
+  python manage.py seed [--count N] [--days N] [--media N] [--media-ratio R]
+  python manage.py archive [--older-than DAYS] [--batch-size N] [--limit N]
+  python manage.py compress-static
 
-This will create or update a `.env` file in the project root and set ADMIN_PASSWORD.
+`set-admin-password` creates or updates a `.env` file in the project root and
+sets ADMIN_PASSWORD. `gc-uploads` deletes files in the upload folder that no
+complaint references (failed inserts, crashed requests, abandoned uploads).
+`check-counters` compares the dashboard counters with the complaints table and,
+with --rebuild, recomputes them. `seed` bulk-loads synthetic complaints for
+load testing and capacity planning. `archive` moves closed complaints older
+than N days into the archive database. `compress-static` writes .gz (and,
+with the brotli package, .br) copies of static files; run it at build time.
 """
 import argparse
 import os
@@ -21,6 +33,31 @@ subparsers = parser.add_subparsers(dest='command')
 set_pwd = subparsers.add_parser('set-admin-password', help='Set ADMIN_PASSWORD in .env')
 set_pwd.add_argument('password', help='New admin password')
 
+gc_uploads = subparsers.add_parser('gc-uploads', help='Delete upload files no complaint references')
+gc_uploads.add_argument('--dry-run', action='store_true', help='List orphaned files without deleting them')
+gc_uploads.add_argument('--min-age', type=int, default=3600,
+                        help='Ignore files modified in the last N seconds (default: 3600)')
+
+check_counters = subparsers.add_parser('check-counters', help='Verify (or rebuild) the status/day counters')
+check_counters.add_argument('--rebuild', action='store_true', help='Recompute all counters from the complaints table')
+
+seed_cmd = subparsers.add_parser('seed', help='Insert synthetic complaints for load testing')
+seed_cmd.add_argument('--count', type=int, default=100000, help='Complaints to insert (default: 100000)')
+seed_cmd.add_argument('--days', type=int, default=365, help='Spread created_at over the last N days (default: 365)')
+seed_cmd.add_argument('--media', type=int, default=0, help='Placeholder images to create in the upload folder')
+seed_cmd.add_argument('--media-ratio', type=float, default=0.2,
+                      help='Share of complaints that reference a placeholder image (default: 0.2)')
+seed_cmd.add_argument('--batch-size', type=int, default=50000, help='Rows per executemany call (default: 50000)')
+seed_cmd.add_argument('--random-seed', type=int, help='Make the generated data reproducible')
+
+archive_cmd = subparsers.add_parser('archive', help='Move old closed complaints into the archive database')
+archive_cmd.add_argument('--older-than', type=int, help='Archive complaints created more than N days ago '
+                         '(default: ARCHIVE_AFTER_DAYS or 365)')
+archive_cmd.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction (default: 500)')
+archive_cmd.add_argument('--limit', type=int, help='Stop after moving N complaints')
+
+subparsers.add_parser('compress-static', help='Precompress static files (.gz/.br) for faster serving')
+
 args = parser.parse_args()
 
 if args.command == 'set-admin-password':
@@ -34,5 +71,104 @@ if args.command == 'set-admin-password':
         print('Failed to update .env')
     else:
         print('ADMIN_PASSWORD updated in', ENV_PATH)
+elif args.command == 'gc-uploads':
+    import archive
+    import db
+    import media
+    import migrations
+    from app import DB_PATH, UPLOAD_FOLDER
+
+    conn = db.connect(DB_PATH)
+    migrations.migrate(conn)
+    # Archived complaints keep their media
+    archive.attach(conn, os.environ.get('ARCHIVE_DATABASE') or os.path.join(os.path.dirname(DB_PATH), 'archive.db'))
+    swept = 0
+    if not args.dry_run:
+        # Files the app already marked as unreferenced but hasn't removed yet
+        while True:
+            _seen, removed = media.sweep(conn, UPLOAD_FOLDER, batch_size=500, grace=args.min_age)
+            swept += len(removed)
+            if len(removed) < 500:
+                break
+    count = 0
+    reclaimed = 0
+    for rel in media.find_orphans(conn, UPLOAD_FOLDER, min_age=args.min_age):
+        path = os.path.join(UPLOAD_FOLDER, rel)
+        try:
+            size = os.path.getsize(path)
+            if args.dry_run:
+                print(rel)
+            else:
+                os.remove(path)
+        except OSError:
+            continue
+        count += 1
+        reclaimed += size
+    conn.close()
+    verb = 'Would remove' if args.dry_run else 'Removed'
+    print(f'{verb} {count} orphaned files ({reclaimed} bytes); swept {swept} unreferenced media entries')
+elif args.command == 'check-counters':
+    import counters
+    import db
+    import migrations
+    from app import DB_PATH
+
+    conn = db.connect(DB_PATH)
+    migrations.migrate(conn)
+    diffs = counters.check(conn)
+    for day, status, stored, actual in diffs:
+        print(f'{day} {status or "(none)"}: counter {stored}, actual {actual}')
+    if args.rebuild:
+        counters.rebuild(conn)
+        conn.commit()
+        print('Counters rebuilt')
+    elif diffs:
+        print(f'{len(diffs)} counters out of sync; run with --rebuild to fix')
+    else:
+        print('Counters are consistent')
+    conn.close()
+elif args.command == 'seed':
+    import time
+
+    import db
+    import migrations
+    import seed
+    from app import DB_PATH, UPLOAD_FOLDER
+
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = db.connect(DB_PATH)
+    migrations.migrate(conn)
+    media_paths = seed.make_media(UPLOAD_FOLDER, args.media) if args.media else ()
+    started = time.perf_counter()
+    added = seed.seed(
+        conn, args.count, days=args.days, batch_size=args.batch_size, media_paths=media_paths,
+        media_ratio=args.media_ratio, random_seed=args.random_seed,
+        progress=lambda n: print(f'  {n}/{args.count}', end='\r', flush=True),
+    )
+    elapsed = time.perf_counter() - started
+    conn.close()
+    print(f'Inserted {added} complaints in {elapsed:.1f}s ({added / max(elapsed, 1e-9):.0f} rows/s)')
+elif args.command == 'archive':
+    import archive
+    import db
+    import migrations
+    from app import DB_PATH
+
+    archive_path = os.environ.get('ARCHIVE_DATABASE') or os.path.join(os.path.dirname(DB_PATH), 'archive.db')
+    days = args.older_than if args.older_than is not None else int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    conn = db.connect(DB_PATH)
+    migrations.migrate(conn)
+    moved = archive.run(conn, archive_path, days, batch_size=args.batch_size, limit=args.limit,
+                        progress=lambda n: print(f'  {n} moved', end='\r', flush=True))
+    conn.close()
+    print(f'Archived {moved} closed complaints older than {days} days into {archive_path}')
+elif args.command == 'compress-static':
+    import compress
+
+    static_dir = os.path.join(BASE_DIR, 'static')
+    for rel, encoding, size in compress.precompress_folder(static_dir):
+        print(f'{rel} ({encoding}): {os.path.getsize(os.path.join(static_dir, rel))} -> {size} bytes')
+    if compress.brotli is None:
+        print('brotli is not installed; only .gz copies were written')
 else:
     parser.print_help()
@@ -0,0 +1,389 @@
+"""Content-addressed storage for uploaded images and videos.
+
+Uploads are written once, in chunks, to a temp file inside the upload folder
+while their SHA-256 is computed, then atomically renamed to
+``<sha[:2]>/<sha>.<ext>``. Identical files therefore share one copy on disk;
+the ``media`` table (kept up to date by triggers on ``complaints``) counts how
+many complaints reference each stored file.
+
+The temp file is kept (hard-linked into the store) until the complaint that
+uses it has committed, then :func:`settle` drops it, or puts it back in place
+if the janitor removed an unreferenced copy of the same content meanwhile.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+INCOMING_DIR = '.incoming'
+
+
+class HashingSpoolFile:
+    """Temp file in the upload folder that hashes everything written to it.
+
+    Used as the Werkzeug upload stream so multipart bodies go straight to disk
+    next to their final location, with no second copy when they are stored.
+    """
+
+    def __init__(self, upload_folder):
+        tmp_dir = os.path.join(upload_folder, INCOMING_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir, prefix='up-')
+        self._file = os.fdopen(fd, 'w+b')
+        self._sha = hashlib.sha256()
+        self._claimed = False
+        self.size = 0
+
+    def write(self, data):
+        self._sha.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._sha.hexdigest()
+
+    def claim(self):
+        """Hand the file over to the caller; close() will no longer delete it."""
+        self._claimed = True
+        self._file.close()
+        return self.path
+
+    def close(self):
+        self._file.close()
+        if not self._claimed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def media_path(digest, ext):
+    return f'{digest[:2]}/{digest}.{ext}'
+
+
+def store(upload_folder, file_storage, ext):
+    """Store an uploaded file by content hash; returns (relative path, spare).
+
+    ``spare`` must be passed to :func:`settle` once the complaint is saved.
+    """
+    spool = file_storage.stream
+    if not isinstance(spool, HashingSpoolFile):
+        spool = HashingSpoolFile(upload_folder)
+        try:
+            file_storage.stream.seek(0)
+        except (AttributeError, OSError):
+            pass
+        shutil.copyfileobj(file_storage.stream, spool, CHUNK_SIZE)
+    spool.flush()
+    return adopt(upload_folder, spool.claim(), spool.hexdigest(), ext)
+
+
+def adopt(upload_folder, path, digest, ext):
+    """Link the finished temp file ``path`` into the store; returns (relative path, path).
+
+    ``path`` itself stays behind as the spare for :func:`settle`.
+    """
+    rel = media_path(digest, ext)
+    dest = os.path.join(upload_folder, rel)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.link(path, dest)
+    except FileExistsError:
+        # Already stored: refresh the mtime so the janitor's grace period
+        # applies; the spare covers it being removed anyway.
+        try:
+            os.utime(dest)
+        except OSError:
+            pass
+    return rel, path
+
+
+def settle(upload_folder, rel, spare):
+    """Release ``spare`` after the complaint referencing ``rel`` committed (or failed).
+
+    The janitor unlinks files only while holding the write lock, so once a
+    reference is committed a missing ``rel`` means it was swept just before:
+    the spare is moved into its place.
+    """
+    if spare is None:
+        return
+    try:
+        if os.path.exists(os.path.join(upload_folder, rel)):
+            os.remove(spare)
+        else:
+            os.replace(spare, os.path.join(upload_folder, rel))
+    except OSError:
+        log.warning('could not settle %s from %s', rel, spare)
+
+
+# Reference counts are maintained by SQLite, so any code path that inserts,
+# updates or deletes complaints (including bulk SQL) keeps them correct.
+MEDIA_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS media (
+        path TEXT PRIMARY KEY,
+        refcount INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS complaints_media_ai AFTER INSERT ON complaints BEGIN
+        INSERT INTO media(path, refcount) SELECT new.image, 1 WHERE new.image IS NOT NULL
+            ON CONFLICT(path) DO UPDATE SET refcount = refcount + 1;
+        INSERT INTO media(path, refcount) SELECT new.video, 1 WHERE new.video IS NOT NULL
+            ON CONFLICT(path) DO UPDATE SET refcount = refcount + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS complaints_media_ad AFTER DELETE ON complaints BEGIN
+        UPDATE media SET refcount = refcount - 1 WHERE path = old.image;
+        UPDATE media SET refcount = refcount - 1 WHERE path = old.video;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS complaints_media_au AFTER UPDATE OF image, video ON complaints BEGIN
+        UPDATE media SET refcount = refcount - 1 WHERE path = old.image AND old.image IS NOT new.image;
+        UPDATE media SET refcount = refcount - 1 WHERE path = old.video AND old.video IS NOT new.video;
+        INSERT INTO media(path, refcount) SELECT new.image, 1 WHERE new.image IS NOT NULL AND old.image IS NOT new.image
+            ON CONFLICT(path) DO UPDATE SET refcount = refcount + 1;
+        INSERT INTO media(path, refcount) SELECT new.video, 1 WHERE new.video IS NOT NULL AND old.video IS NOT new.video
+            ON CONFLICT(path) DO UPDATE SET refcount = refcount + 1;
+    END
+    ''',
+]
+
+
+def ensure_schema(conn):
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'media'"
+    ).fetchone() is not None
+    for stmt in MEDIA_SCHEMA:
+        conn.execute(stmt)
+    if not existed:
+        conn.execute(
+            '''
+            INSERT INTO media(path, refcount)
+            SELECT path, COUNT(*) FROM (
+                SELECT image AS path FROM complaints WHERE image IS NOT NULL
+                UNION ALL
+                SELECT video FROM complaints WHERE video IS NOT NULL
+            ) GROUP BY path
+            '''
+        )
+
+
+def add_refs(conn, after_id):
+    """Count references from complaints with id > ``after_id`` inserted without the trigger."""
+    conn.execute(
+        '''
+        INSERT INTO media(path, refcount)
+        SELECT path, COUNT(*) FROM (
+            SELECT image AS path FROM complaints WHERE id > ?1 AND image IS NOT NULL
+            UNION ALL
+            SELECT video FROM complaints WHERE id > ?1 AND video IS NOT NULL
+        ) WHERE true GROUP BY path
+        ON CONFLICT(path) DO UPDATE SET refcount = refcount + excluded.refcount
+        ''',
+        (after_id,),
+    )
+
+
+def sweep(conn, upload_folder, batch_size=200, grace=60):
+    """Delete one batch of files that no complaint references any more.
+
+    Candidates are ``media`` rows whose refcount dropped to zero. Files
+    touched within ``grace`` seconds are left alone for now, since an upload
+    of identical content may be about to reference them again. Returns
+    ``(candidates_seen, paths_removed)``.
+    """
+    rows = conn.execute('SELECT path FROM media WHERE refcount <= 0 LIMIT ?', (batch_size,)).fetchall()
+    cutoff = time.time() - grace
+    ready = []
+    for (rel,) in rows:
+        try:
+            if os.path.getmtime(os.path.join(upload_folder, rel)) > cutoff:
+                continue
+        except OSError:
+            pass  # already gone; just drop the row
+        ready.append(rel)
+    if ready:
+        marks = ', '.join('?' * len(ready))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-check refcount: a new submission may have revived the file.
+            # Files are unlinked before the write lock is released, so a
+            # submission committing after this finds them gone (see settle).
+            ready = [r[0] for r in conn.execute(
+                f'DELETE FROM media WHERE refcount <= 0 AND path IN ({marks}) RETURNING path', ready
+            ).fetchall()]
+            remove_files(upload_folder, ready)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(rows), ready
+
+
+class MediaJanitor:
+    """Background thread that removes unreferenced media in batches.
+
+    Request handlers only delete rows (the triggers mark the media) and call
+    :meth:`wake`; the filesystem work happens here, off the request path.
+    """
+
+    def __init__(self, pool, upload_folder, interval=30, batch_size=200, grace=60):
+        self.pool = pool
+        self.upload_folder = upload_folder
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace = grace
+        self.removed = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Sweep every ``interval`` seconds from now on, deletes or not.
+
+        Picks up media left unreferenced before a crash or restart.
+        """
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='media-janitor', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception:
+                log.exception('media janitor pass failed')
+
+    def run_once(self):
+        conn = self.pool.acquire()
+        try:
+            while True:
+                _seen, removed = sweep(conn, self.upload_folder, self.batch_size, self.grace)
+                self.removed += len(removed)
+                if len(removed) < self.batch_size:
+                    return
+        finally:
+            self.pool.release(conn)
+
+
+def derived_files(upload_folder, rel):
+    """Files generated from ``rel`` (thumbnails), named ``<rel>.<suffix>``."""
+    folder, base = os.path.split(os.path.join(upload_folder, rel))
+    prefix = base + '.'
+    try:
+        return [os.path.join(folder, e.name) for e in os.scandir(folder) if e.name.startswith(prefix)]
+    except OSError:
+        return []
+
+
+def remove_files(upload_folder, paths):
+    removed = 0
+    for rel in paths:
+        for path in [os.path.join(upload_folder, rel)] + derived_files(upload_folder, rel):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+# <name>.<size>.<fmt>: a rendition that lives and dies with <name>
+_DERIVED_RE = re.compile(r'^(.+)\.[a-z]+\.[a-z]+$')
+
+
+def iter_upload_files(upload_folder):
+    """Yield (relative path, mtime) for every file under the upload folder."""
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            entries = list(os.scandir(os.path.join(upload_folder, rel_dir)))
+        except OSError:
+            continue
+        for e in entries:
+            rel = f'{rel_dir}/{e.name}' if rel_dir else e.name
+            if e.is_dir(follow_symlinks=False):
+                stack.append(rel)
+            elif e.is_file(follow_symlinks=False):
+                yield rel, e.stat().st_mtime
+
+
+def find_orphans(conn, upload_folder, min_age=3600, batch_size=500):
+    """Yield files under ``upload_folder`` that no complaint's image/video uses.
+
+    Referenced paths are collected once into an indexed temp table and the
+    directory walk is checked against it in batches, so memory stays flat
+    however many uploads there are. Files newer than ``min_age`` seconds are
+    skipped so in-flight submissions are safe.
+    """
+    conn.execute('DROP TABLE IF EXISTS temp.referenced_media')
+    conn.execute('CREATE TEMP TABLE referenced_media (path TEXT PRIMARY KEY) WITHOUT ROWID')
+    # Archived complaints (an attached database) still reference their media
+    schemas = [r[1] for r in conn.execute('PRAGMA database_list') if r[1] != 'temp']
+    for schema in schemas:
+        if conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'complaints'").fetchone():
+            conn.execute(
+                'INSERT OR IGNORE INTO temp.referenced_media(path)'
+                f' SELECT image FROM {schema}.complaints WHERE image IS NOT NULL'
+                f' UNION ALL SELECT video FROM {schema}.complaints WHERE video IS NOT NULL'
+            )
+    cutoff = time.time() - min_age
+
+    def owner(rel):
+        m = _DERIVED_RE.match(rel)
+        return m.group(1) if m else None
+
+    def check(batch):
+        keys = list({k for rel in batch for k in (rel, owner(rel)) if k})
+        found = set()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ', '.join('?' * len(chunk))
+            found.update(r[0] for r in conn.execute(
+                f'SELECT path FROM temp.referenced_media WHERE path IN ({marks})', chunk
+            ))
+        for rel in batch:
+            if rel.startswith(INCOMING_DIR + '/'):
+                yield rel  # abandoned partial upload
+            elif rel not in found and owner(rel) not in found:
+                yield rel
+
+    try:
+        batch = []
+        for rel, mtime in iter_upload_files(upload_folder):
+            if mtime > cutoff:
+                continue
+            batch.append(rel)
+            if len(batch) >= batch_size:
+                yield from check(batch)
+                batch = []
+        if batch:
+            yield from check(batch)
+    finally:
+        conn.execute('DROP TABLE IF EXISTS temp.referenced_media')
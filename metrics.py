@@ -0,0 +1,117 @@
+"""Per-endpoint request metrics in the Prometheus text exposition format.
+
+Observations are a bucket increment and a few additions under one lock, and
+rendering walks a handful of fixed-size series, so the overhead is the same
+whether ``/admin/metrics`` is scraped every few seconds or never. Like the
+other in-process stats, every worker process reports its own numbers.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Fixed-bucket histogram with one series per label tuple (not locked)."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [count per bucket..., count above last bucket, sum]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self._series.items()):
+            total = 0
+            for bound, n in zip(self.buckets + ('+Inf',), series):
+                total += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {total}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_num(series[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {total}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one value per label tuple (not locked)."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {_num(value)}')
+        return lines
+
+
+class RequestMetrics:
+    """Latency, response size and database time per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter('http_requests_total', 'Requests handled, by endpoint, method and status.',
+                                ('endpoint', 'method', 'status'))
+        self.latency = Histogram('http_request_duration_seconds', 'Time from the first before_request hook '
+                                 'until the response body was sent.', ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.size = Histogram('http_response_size_bytes', 'Response body size.', ('endpoint', 'method'),
+                              SIZE_BUCKETS)
+        self.db_time = Histogram('http_request_db_seconds', 'Time spent in SQLite per request.',
+                                 ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.db_queries = Counter('http_request_db_queries_total', 'SQL statements executed.', ('endpoint', 'method'))
+
+    def observe(self, endpoint, method, status, duration, size, db_time, db_queries):
+        key = (endpoint, method)
+        with self._lock:
+            self.requests.inc((endpoint, method, str(status)))
+            self.latency.observe(key, duration)
+            if size is not None:
+                self.size.observe(key, size)
+            self.db_time.observe(key, db_time)
+            if db_queries:
+                self.db_queries.inc(key, db_queries)
+
+    def render(self, extra=()):
+        """Exposition text; ``extra`` adds unlabelled (name, type, help, value) samples."""
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.size, self.db_time, self.db_queries):
+                lines.extend(metric.render())
+        for name, kind, help_text, value in extra:
+            if value is None:
+                continue
+            lines.extend((f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {_num(value)}'))
+        return '\n'.join(lines) + '\n'
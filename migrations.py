@@ -0,0 +1,172 @@
+"""Versioned schema migrations for the complaints database.
+
+The schema version lives in ``PRAGMA user_version``. Each migration runs in
+its own write transaction and bumps the version as its last step, so a
+crashed or concurrent start-up never applies a step twice. Both ``app.py``
+and ``init_db.py`` go through :func:`migrate`.
+"""
+import archive
+import counters
+import media
+import search
+
+
+def _base_schema(conn):
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS complaints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            room TEXT,
+            title TEXT,
+            description TEXT,
+            image TEXT,
+            video TEXT,
+            address TEXT,
+            phone TEXT,
+            access_code TEXT,
+            status TEXT DEFAULT 'open',
+            created_at TEXT
+        )
+        '''
+    )
+    # Databases created by older versions of the app (or the old init_db.py)
+    # are missing some of these columns.
+    cols = {r[1] for r in conn.execute('PRAGMA table_info(complaints)')}
+    for col in ('access_code', 'address', 'phone', 'video'):
+        if col not in cols:
+            conn.execute(f'ALTER TABLE complaints ADD COLUMN {col} TEXT')
+
+
+def _search_index(conn):
+    # No-op on SQLite builds without FTS5; the app falls back to LIKE search
+    search.ensure_index(conn)
+
+
+def _lookup_indexes(conn):
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_complaints_access_code ON complaints(access_code)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_complaints_status_created ON complaints(status, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_complaints_created ON complaints(created_at)')
+    conn.execute('ANALYZE complaints')
+
+
+def _media_refcounts(conn):
+    media.ensure_schema(conn)
+
+
+def _dead_media_index(conn):
+    # Lets the media janitor find unreferenced files without scanning
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_media_dead ON media(path) WHERE refcount <= 0')
+
+
+def _status_counters(conn):
+    counters.ensure_schema(conn)
+
+
+def _archived_codes(conn):
+    archive.ensure_main_schema(conn)
+
+
+def _row_versions(conn):
+    # Bumped whenever a displayed column changes; the admin list caches each
+    # row's HTML under (id, version). The nested UPDATE does not re-fire it
+    # (recursive_triggers is off) nor the column-specific triggers.
+    conn.execute('ALTER TABLE complaints ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    conn.execute(
+        '''
+        CREATE TRIGGER IF NOT EXISTS complaints_version_au AFTER UPDATE OF
+            name, room, title, description, image, video, address, phone, access_code, status, created_at
+        ON complaints BEGIN
+            UPDATE complaints SET version = old.version + 1 WHERE id = new.id;
+        END
+        '''
+    )
+
+
+# Fractional seconds are cut off, as int(timestamp()) does in the app:
+# strftime('%s') would round 23:59:59.9995 into the next day. A missing or
+# unparseable created_at becomes 0, so created_ts is never NULL.
+_CREATED_TS = "COALESCE(CAST(strftime('%s', substr({row}created_at, 1, 19)) AS INTEGER), 0)"
+
+
+def _created_ts(conn):
+    # created_at is a naive UTC ISO string; an integer copy (Unix seconds)
+    # turns date ranges into compact index seeks. It replaces the
+    # created_at indexes for filtering, pagination and archiving.
+    conn.execute('ALTER TABLE complaints ADD COLUMN created_ts INTEGER')
+    conn.execute(f"UPDATE complaints SET created_ts = {_CREATED_TS.format(row='')}")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_complaints_created_ts ON complaints(created_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_complaints_status_created_ts ON complaints(status, created_ts)')
+    conn.execute('DROP INDEX IF EXISTS idx_complaints_created')
+    conn.execute('DROP INDEX IF EXISTS idx_complaints_status_created')
+    # The app writes both columns; these keep created_ts right (and never
+    # NULL, which keyset pagination could not page past) for rows inserted
+    # or re-dated by anything that only sets created_at
+    conn.execute(
+        f'''
+        CREATE TRIGGER IF NOT EXISTS complaints_created_ts_ai AFTER INSERT ON complaints
+        WHEN new.created_ts IS NULL
+        BEGIN
+            UPDATE complaints SET created_ts = {_CREATED_TS.format(row='new.')} WHERE id = new.id;
+        END
+        '''
+    )
+    conn.execute(
+        f'''
+        CREATE TRIGGER IF NOT EXISTS complaints_created_ts_au AFTER UPDATE OF created_at, created_ts ON complaints
+        WHEN new.created_at IS NOT old.created_at OR new.created_ts IS NULL
+        BEGIN
+            UPDATE complaints SET created_ts = {_CREATED_TS.format(row='new.')} WHERE id = new.id;
+        END
+        '''
+    )
+    conn.execute('ANALYZE complaints')
+
+
+# (version, description, function). Append new steps; never edit old ones.
+MIGRATIONS = [
+    (1, 'base complaints table', _base_schema),
+    (2, 'FTS5 search index', _search_index),
+    (3, 'access_code, status and created_at indexes', _lookup_indexes),
+    (4, 'media reference counts', _media_refcounts),
+    (5, 'index of unreferenced media', _dead_media_index),
+    (6, 'trigger-maintained status/day counters', _status_counters),
+    (7, 'access codes of archived complaints', _archived_codes),
+    (8, 'row version for the admin list fragment cache', _row_versions),
+    (9, 'integer created_ts column and indexes', _created_ts),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to LATEST_VERSION and return the version applied."""
+    if conn.in_transaction:
+        conn.commit()
+    # The common case on start-up: one PRAGMA read and no write lock
+    if current_version(conn) >= LATEST_VERSION:
+        return current_version(conn)
+    for version, _desc, step in MIGRATIONS:
+        if current_version(conn) >= version:
+            continue
+        # Take the write lock first, then re-check: another worker may have
+        # applied this step while we were waiting.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if current_version(conn) < version:
+                step(conn)
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return current_version(conn)
+
+
+def pending(conn):
+    version = current_version(conn)
+    return [(v, desc) for v, desc, _step in MIGRATIONS if v > version]
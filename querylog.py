@@ -0,0 +1,111 @@
+"""Slow-query log for the pooled SQLite connections.
+
+Statements slower than a threshold are grouped by their normalised SQL with
+a count, the worst and total time, and the shape of their parameters (types,
+never values). The query plan is looked up with ``EXPLAIN QUERY PLAN`` when
+the log is viewed rather than when the statement is recorded, so recording
+never runs SQL of its own.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+_WS_RE = re.compile(r'\s+')
+# Bulk selections bind one placeholder per id; treat them as one statement
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def normalize(sql):
+    return _IN_LIST_RE.sub('(?, ...)', _WS_RE.sub(' ', sql).strip())
+
+
+def params_shape(parameters):
+    """Describe bound parameters by type, e.g. ``'str, int x3'`` or ``':status str'``."""
+    if parameters is None:
+        return 'many'
+    if isinstance(parameters, dict):
+        return ', '.join(f':{k} {type(v).__name__}' for k, v in parameters.items()) or 'none'
+    runs = []
+    for value in parameters:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return ', '.join(name if n == 1 else f'{name} x{n}' for name, n in runs) or 'none'
+
+
+def explain(conn, sql, parameters):
+    """``EXPLAIN QUERY PLAN`` rows as indented lines, or None if not applicable."""
+    if parameters is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        rows = conn.cursor(sqlite3.Cursor).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return [f'(no plan: {e})']
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _notused, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+class SlowQueryLog:
+    """Keeps the ``maxlen`` most recently seen slow statements."""
+
+    def __init__(self, threshold_ms=100, maxlen=50):
+        self.threshold = threshold_ms / 1000.0
+        self.maxlen = maxlen
+        self._entries = OrderedDict()  # normalised sql -> dict
+        self._lock = threading.Lock()
+
+    def record(self, sql, parameters, seconds):
+        """Statement hook for :class:`db.TimedConnection`."""
+        if seconds < self.threshold:
+            return
+        key = normalize(sql)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = {'sql': key, 'count': 0, 'total': 0.0, 'max': 0.0, 'plan': None}
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['last_seen'] = time.time()
+            entry['shape'] = params_shape(parameters)
+            if parameters is not None:
+                # Kept only to run EXPLAIN QUERY PLAN; never displayed
+                entry['statement'] = (sql, parameters)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxlen:
+                self._entries.popitem(last=False)
+        log.warning('slow query (%.0f ms, params: %s): %s', seconds * 1000, entry['shape'], key)
+
+    def entries(self, conn=None):
+        """Entries, slowest first; with ``conn``, missing query plans are filled in."""
+        with self._lock:
+            entries = [dict(e) for e in self._entries.values()]
+        for entry in entries:
+            if entry['plan'] is None and conn is not None:
+                entry['plan'] = explain(conn, *entry.get('statement', (entry['sql'], None)))
+                with self._lock:
+                    if entry['sql'] in self._entries:
+                        self._entries[entry['sql']]['plan'] = entry['plan']
+            entry.pop('statement', None)
+            entry['avg'] = entry['total'] / entry['count']
+            entry['full_scans'] = [m.group(1) for line in entry['plan'] or ()
+                                   for m in [_FULL_SCAN_RE.match(line.strip())] if m]
+        entries.sort(key=lambda e: e['max'], reverse=True)
+        return entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,147 @@
+"""Token-bucket rate limiting for the public endpoints.
+
+Each rule is a bucket of ``capacity`` tokens refilled at ``capacity / period``
+tokens per second; a request takes one token from every bucket that applies
+to it, or, if any of them is empty, takes none and is refused with the number
+of seconds until it may retry. Buckets live in memory by default, or in a
+small SQLite file shared by all workers on the host.
+"""
+import math
+import os
+import threading
+import time
+
+import db
+
+
+def parse_rule(spec):
+    """Parse ``'<count>/<seconds>'`` into (capacity, tokens per second)."""
+    count, _, period = spec.partition('/')
+    capacity = float(count)
+    return capacity, capacity / float(period or 1)
+
+
+def _waits(buckets, levels):
+    return [0.0 if tokens >= 1 else (1 - tokens) / rate for (_key, _capacity, rate), tokens in zip(buckets, levels)]
+
+
+class MemoryStore:
+    """Buckets in a dict; cheap, but each worker process limits on its own."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, buckets, now=None):
+        """Take a token from each ``(key, capacity, rate)`` if all have one.
+
+        Returns the wait in seconds for each bucket (all 0 when the tokens
+        were taken).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            levels = []
+            for key, capacity, rate in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated) * rate))
+            waits = _waits(buckets, levels)
+            for (key, _capacity, _rate), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens if any(waits) else tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return waits
+
+    def _prune(self, now):
+        # Forget buckets idle for an hour; with any sensible rule they are full again
+        horizon = now - 3600
+        for key, (_tokens, updated) in list(self._buckets.items()):
+            if updated < horizon:
+                del self._buckets[key]
+
+
+class SQLiteStore:
+    """Buckets in a shared SQLite file so all workers enforce one limit."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+            '''
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = db.connect(self.path, cache_size_kb=1024, mmap_size=0)
+            conn.isolation_level = None
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets, now=None):
+        """Same as :meth:`MemoryStore.take`, in one transaction."""
+        # Wall clock, since buckets are shared between processes
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key, capacity, rate in buckets:
+                row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+                levels.append(capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate))
+            waits = _waits(buckets, levels)
+            conn.executemany(
+                'INSERT INTO buckets(key, tokens, updated_at) VALUES (?, ?, ?)'
+                ' ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                [(key, tokens if any(waits) else tokens - 1, now)
+                 for (key, _capacity, _rate), tokens in zip(buckets, levels)],
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return waits
+
+
+class RateLimiter:
+    """Applies per-client and global buckets to named endpoints.
+
+    ``rules`` maps an endpoint name to ``{'ip': spec, 'global': spec}``; either
+    scope may be omitted. A request refused by any bucket spends no tokens,
+    so a single abusive client can't drain the global budget and a global
+    rejection doesn't cost the client its own allowance.
+    """
+
+    def __init__(self, store, rules):
+        self.store = store
+        self.rules = {
+            endpoint: [(scope, parse_rule(spec)) for scope, spec in scopes.items() if spec]
+            for endpoint, scopes in rules.items()
+        }
+        self._lock = threading.Lock()
+        self.rejected = {}
+
+    def check(self, endpoint, client):
+        """Return 0 if the request may proceed, else seconds until it may retry."""
+        rules = self.rules.get(endpoint)
+        if not rules:
+            return 0
+        buckets = [(f'{endpoint}:{client}' if scope == 'ip' else f'{endpoint}:*', capacity, rate)
+                   for scope, (capacity, rate) in rules]
+        waits = self.store.take(buckets)
+        if not any(waits):
+            return 0
+        with self._lock:
+            for (scope, _rule), wait in zip(rules, waits):
+                if wait:
+                    name = f'{endpoint}:{scope}'
+                    self.rejected[name] = self.rejected.get(name, 0) + 1
+        return max(1, math.ceil(max(waits)))
@@ -0,0 +1,94 @@
+"""Full-text search over complaints using an SQLite FTS5 index.
+
+``complaints_fts`` is an external-content table: it stores only the index and
+reads column values back from ``complaints``. Triggers keep it in step with
+inserts, updates and deletes.
+"""
+import re
+import sqlite3
+
+from markupsafe import Markup, escape
+
+FTS_COLUMNS = ('title', 'description', 'name', 'room', 'address')
+
+# Control characters never appear in form input, so they are safe markers for
+# snippet() to wrap matches in before the text is HTML-escaped.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+_cols = ', '.join(FTS_COLUMNS)
+_new_cols = ', '.join('new.' + c for c in FTS_COLUMNS)
+_old_cols = ', '.join('old.' + c for c in FTS_COLUMNS)
+
+FTS_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS complaints_fts USING fts5(
+        {_cols},
+        content='complaints', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS complaints_fts_ai AFTER INSERT ON complaints BEGIN
+        INSERT INTO complaints_fts(rowid, {_cols}) VALUES (new.id, {_new_cols});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS complaints_fts_ad AFTER DELETE ON complaints BEGIN
+        INSERT INTO complaints_fts(complaints_fts, rowid, {_cols}) VALUES ('delete', old.id, {_old_cols});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS complaints_fts_au AFTER UPDATE OF {_cols} ON complaints BEGIN
+        INSERT INTO complaints_fts(complaints_fts, rowid, {_cols}) VALUES ('delete', old.id, {_old_cols});
+        INSERT INTO complaints_fts(rowid, {_cols}) VALUES (new.id, {_new_cols});
+    END
+    """,
+]
+
+
+def ensure_index(conn):
+    """Create the FTS table and triggers, backfilling existing rows.
+
+    Returns False when this SQLite build has no FTS5 support, in which case
+    callers should fall back to LIKE matching.
+    """
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'complaints_fts'"
+    ).fetchone() is not None
+    try:
+        for stmt in FTS_SCHEMA:
+            conn.execute(stmt)
+    except sqlite3.OperationalError:
+        return False
+    if not existed:
+        rebuild_index(conn)
+    return True
+
+
+def rebuild_index(conn):
+    conn.execute("INSERT INTO complaints_fts(complaints_fts) VALUES ('rebuild')")
+
+
+def index_rows(conn, after_id):
+    """Index complaints with id > ``after_id`` that were inserted without the trigger."""
+    conn.execute(f'INSERT INTO complaints_fts(rowid, {_cols}) SELECT id, {_cols} FROM complaints WHERE id > ?',
+                 (after_id,))
+
+
+def match_expression(text):
+    """Turn free text from the search box into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix query, ANDed together, so partially
+    typed words still match and FTS syntax characters can't cause errors.
+    """
+    terms = re.findall(r'\w+', text, flags=re.UNICODE)
+    return ' '.join('"{}"*'.format(t) for t in terms)
+
+
+def highlight(snippet):
+    """HTML-escape a snippet() result and turn its markers into <mark> tags."""
+    if not snippet:
+        return None
+    html = str(escape(snippet))
+    return Markup(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
@@ -0,0 +1,226 @@
+"""Synthetic complaints for capacity planning and benchmarks.
+
+Rows look like real traffic: most complaints are recent (volume grows over
+the seeded period) and arrive during the day, older ones are mostly closed,
+and a share reference small placeholder photos. Everything is inserted in one
+transaction with ``executemany``; the per-row FTS, counter and media triggers
+are dropped for the load and their tables are updated with one set-based
+statement each before the triggers are put back.
+When the table starts out empty its indexes are also built after the load.
+"""
+import calendar
+import hashlib
+import itertools
+import os
+import random
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+import counters
+import media
+import search
+
+FIRST_NAMES = ('Aarav', 'Ana', 'Ben', 'Chen', 'Divya', 'Elena', 'Farah', 'George', 'Hana', 'Ivan',
+               'Jia', 'Kofi', 'Lena', 'Mateo', 'Nadia', 'Omar', 'Priya', 'Rahul', 'Sara', 'Tom',
+               'Uma', 'Victor', 'Wei', 'Yusuf', 'Zoe')
+LAST_NAMES = ('Ahmed', 'Brown', 'Costa', 'Das', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Iyer',
+              'Jones', 'Khan', 'Li', 'Martin', 'Nguyen', 'Okafor', 'Patel', 'Rossi', 'Singh',
+              'Smith', 'Tanaka', 'Wang', 'Williams')
+BLOCKS = 'ABCDEFGH'
+FLOORS = 8
+ROOMS_PER_FLOOR = 24
+
+# (weight, title, description templates); {room}, {floor} and {block} are filled in
+ISSUES = (
+    (14, 'Leaking tap', ('The tap in room {room} drips all night.', 'Bathroom tap on floor {floor} keeps running.')),
+    (10, 'No hot water', ('No hot water in the showers on floor {floor} since yesterday.',
+                          'Water is cold in room {room} every morning.')),
+    (9, 'Wi-Fi not working', ('Wi-Fi drops every few minutes in room {room}.', 'No internet on floor {floor} of block {block}.')),
+    (8, 'Broken light', ('Ceiling light in room {room} flickers and went out.', 'Corridor lights on floor {floor} are off.')),
+    (7, 'Heater broken', ('Radiator in room {room} stays cold.', 'Heating is off in block {block}.')),
+    (6, 'Door lock jammed', ('Cannot lock the door of room {room}.', 'Key gets stuck in the lock of room {room}.')),
+    (6, 'Noise complaint', ('Loud music from the floor above room {room} after midnight.',
+                            'Construction noise in block {block} from 6am.')),
+    (5, 'Blocked drain', ('Shower drain in room {room} is blocked.', 'Sink on floor {floor} kitchen does not drain.')),
+    (4, 'Mould on wall', ('Black mould growing near the window in room {room}.', 'Damp patch on the ceiling of room {room}.')),
+    (4, 'Pest sighting', ('Saw mice in the kitchen on floor {floor}.', 'Cockroaches in room {room} near the sink.')),
+    (3, 'Lift out of order', ('The lift in block {block} is stuck on floor {floor}.', 'Lift doors in block {block} do not close.')),
+    (3, 'Broken window', ('Window in room {room} will not close.', 'Cracked window pane in room {room}.')),
+    (2, 'Power socket sparking', ('Socket by the desk in room {room} sparks when used.',)),
+    (2, 'Bins not collected', ('Bins behind block {block} have not been emptied for a week.',)),
+)
+
+# Share of complaints that are closed / in progress by age in days; the rest are open
+STATUS_BY_AGE = (
+    (2, 0.05, 0.25),
+    (7, 0.35, 0.35),
+    (30, 0.75, 0.15),
+    (None, 0.95, 0.03),
+)
+
+# Relative arrival rate per hour of day (UTC)
+HOUR_WEIGHTS = (1, 1, 1, 1, 1, 2, 3, 5, 8, 9, 8, 7, 7, 7, 7, 8, 8, 9, 10, 10, 9, 7, 4, 2)
+
+_HOUR_CUM_WEIGHTS = list(itertools.accumulate(HOUR_WEIGHTS))
+_ISSUE_CUM_WEIGHTS = list(itertools.accumulate(w for w, _t, _d in ISSUES))
+
+_INSERT_SQL = (
+    'INSERT OR IGNORE INTO complaints'
+    ' (name, room, title, description, image, video, address, phone, access_code, status, created_at, created_ts)'
+    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+_INSERT_TRIGGERS = ('complaints_fts_ai', 'complaints_counts_ai', 'complaints_media_ai')
+
+_SCHEMA_SQL = "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = 'complaints' AND sql IS NOT NULL"
+
+
+def _timestamps(rnd, count, now, days):
+    """``count`` ascending (age in days, ISO, Unix) timestamps over the ``days`` before today, skewed recent."""
+    first_day = now.date() - timedelta(days=days)
+    first_ts = calendar.timegm(first_day.timetuple())
+    day_names = [(first_day + timedelta(days=d)).isoformat() for d in range(days)]
+    hours = rnd.choices(range(24), cum_weights=_HOUR_CUM_WEIGHTS, k=count)
+    # sqrt of a uniform draw: density grows linearly towards today
+    offsets = sorted(
+        int(days * rnd.random() ** 0.5) * 86400 + hour * 3600 + int(rnd.random() * 3600)
+        for hour in hours
+    )
+    for offset in offsets:
+        day, rem = divmod(offset, 86400)
+        hour, rem = divmod(rem, 3600)
+        minute, second = divmod(rem, 60)
+        yield days - day, f'{day_names[day]}T{hour:02d}:{minute:02d}:{second:02d}', first_ts + offset
+
+
+def _status(rnd, age_days):
+    for max_age, closed, in_progress in STATUS_BY_AGE:
+        if max_age is None or age_days <= max_age:
+            break
+    r = rnd.random()
+    if r < closed:
+        return 'closed'
+    if r < closed + in_progress:
+        return 'in-progress'
+    return 'open'
+
+
+def generate(rnd, count, now, days, media_paths=(), media_ratio=0.0, batch_size=50000):
+    """Yield lists of complaint rows (in ``_INSERT_SQL`` column order), oldest first."""
+    code_base = rnd.getrandbits(40)
+    timestamps = _timestamps(rnd, count, now, days)
+    for start in range(0, count, batch_size):
+        n = min(batch_size, count - start)
+        issues = rnd.choices(ISSUES, cum_weights=_ISSUE_CUM_WEIGHTS, k=n)
+        blocks = rnd.choices(BLOCKS, k=n)
+        first = rnd.choices(FIRST_NAMES, k=n)
+        last = rnd.choices(LAST_NAMES, k=n)
+        batch = []
+        for j in range(n):
+            _w, title, descriptions = issues[j]
+            block = blocks[j]
+            floor = 1 + int(rnd.random() * FLOORS)
+            room = f'{block}{floor}{1 + int(rnd.random() * ROOMS_PER_FLOOR):02d}'
+            image = rnd.choice(media_paths) if media_paths and rnd.random() < media_ratio else None
+            age_days, created, created_ts = next(timestamps)
+            batch.append((
+                f'{first[j]} {last[j]}',
+                room,
+                title,
+                descriptions[int(rnd.random() * len(descriptions))].format(room=room, floor=floor, block=block),
+                image,
+                None,
+                f'Block {block}, Floor {floor}',
+                f'+1 555 {int(rnd.random() * 10000000):07d}',
+                # An odd multiplier permutes 40-bit values, so codes in one run never collide
+                f'{(code_base + (start + j) * 0x9E3779B97) % (1 << 40):010x}',
+                _status(rnd, age_days),
+                created,
+                created_ts,
+            ))
+        yield batch
+
+
+def _png(rgb):
+    """A valid 1x1 PNG of colour ``rgb``."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b'\x00' + bytes(rgb)))
+            + chunk(b'IEND', b''))
+
+
+def make_media(upload_folder, count):
+    """Write ``count`` distinct placeholder images; return their relative paths."""
+    paths = []
+    for n in range(count):
+        data = _png(((n >> 16) & 255, (n >> 8) & 255, n & 255))
+        rel = media.media_path(hashlib.sha256(data).hexdigest(), 'png')
+        path = os.path.join(upload_folder, rel)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        paths.append(rel)
+    return paths
+
+
+def seed(conn, count, days=365, now=None, batch_size=50000, media_paths=(), media_ratio=0.0,
+         random_seed=None, progress=None):
+    """Insert ``count`` synthetic complaints and return how many were added.
+
+    ``conn`` must be migrated and not inside a transaction. ``progress`` is
+    called with the running total after each batch.
+    """
+    rnd = random.Random(random_seed)
+    now = now or datetime.utcnow()
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'complaints_fts'"
+    ).fetchone() is not None
+    sync = conn.execute('PRAGMA synchronous').fetchone()[0]
+    cache_size = conn.execute('PRAGMA cache_size').fetchone()[0]
+    # Losing a half-finished seed on power failure is fine; a large page cache
+    # keeps the index B-trees in memory for the whole load.
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        first_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM complaints').fetchone()[0]
+        # Into an empty table it is cheaper to build the indexes once at the
+        # end than to update them row by row.
+        dropped = [
+            (kind, name, sql) for kind, name, sql in conn.execute(_SCHEMA_SQL)
+            if name in _INSERT_TRIGGERS or (kind == 'index' and not first_id)
+        ]
+        for kind, name, _sql in dropped:
+            conn.execute(f'DROP {kind.upper()} {name}')
+        done = 0
+        for batch in generate(rnd, count, now, days, media_paths, media_ratio, batch_size):
+            conn.executemany(_INSERT_SQL, batch)
+            done += len(batch)
+            if progress:
+                progress(done)
+        added = conn.execute('SELECT COUNT(*) FROM complaints WHERE id > ?', (first_id,)).fetchone()[0]
+        _catch_up(conn, first_id, has_fts)
+        for _kind, _name, sql in dropped:
+            conn.execute(sql)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(f'PRAGMA synchronous = {int(sync)}')
+        conn.execute(f'PRAGMA cache_size = {int(cache_size)}')
+    conn.execute('ANALYZE complaints')
+    conn.commit()
+    return added
+
+
+def _catch_up(conn, first_id, has_fts):
+    """Do the work of the dropped insert triggers for rows after ``first_id``."""
+    if has_fts:
+        search.index_rows(conn, first_id)
+    counters.add_rows(conn, first_id)
+    media.add_refs(conn, first_id)
@@ -0,0 +1,59 @@
+"""created_ts is created_at in whole Unix seconds, however the row got it."""
+import calendar
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+LAST_MOMENT = '2023-11-15T23:59:59.999999'
+EXPECTED = calendar.timegm(datetime(2023, 11, 15, 23, 59, 59).timetuple())
+
+
+def _insert(conn, access_code, created_at):
+    conn.execute('INSERT INTO complaints (title, access_code, created_at) VALUES (?, ?, ?)',
+                 ('t', access_code, created_at))
+
+
+def test_backfill_truncates_fractional_seconds(tmp_path):
+    conn = db.connect(str(tmp_path / 'complaints.db'))
+    for version, _desc, step in migrations.MIGRATIONS:
+        if version == 9:
+            break
+        step(conn)
+        conn.execute(f'PRAGMA user_version = {version}')
+    _insert(conn, 'a', LAST_MOMENT)
+    conn.commit()
+    migrations.migrate(conn)
+    assert conn.execute('SELECT created_ts FROM complaints').fetchone()[0] == EXPECTED
+    conn.close()
+
+
+def test_triggers_fill_created_ts(tmp_path):
+    conn = db.connect(str(tmp_path / 'complaints.db'))
+    migrations.migrate(conn)
+    _insert(conn, 'a', LAST_MOMENT)
+    _insert(conn, 'b', '2020-01-01T00:00:00')
+    conn.execute("UPDATE complaints SET created_at = ? WHERE access_code = 'b'", (LAST_MOMENT,))
+    conn.commit()
+    assert [r[0] for r in conn.execute('SELECT created_ts FROM complaints')] == [EXPECTED, EXPECTED]
+    conn.close()
+
+
+def test_created_ts_is_never_null(tmp_path):
+    conn = db.connect(str(tmp_path / 'complaints.db'))
+    migrations.migrate(conn)
+    _insert(conn, 'a', 'not a date')
+    _insert(conn, 'b', None)
+    _insert(conn, 'c', LAST_MOMENT)
+    conn.execute("UPDATE complaints SET created_ts = NULL WHERE access_code = 'c'")
+    conn.commit()
+    assert [r[0] for r in conn.execute('SELECT created_ts FROM complaints ORDER BY id')] == [0, 0, EXPECTED]
+    # So keyset pagination past the newest row still reaches the others
+    rows = conn.execute('SELECT access_code FROM complaints WHERE (created_ts, id) < (?, ?)'
+                        ' ORDER BY created_ts DESC, id DESC', (EXPECTED, 3)).fetchall()
+    assert [r[0] for r in rows] == ['b', 'a']
+    conn.close()
@@ -0,0 +1,58 @@
+"""The hot queries stay index seeks on a freshly migrated database."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = db.connect(str(tmp_path / 'complaints.db'))
+    migrations.migrate(conn)
+    yield conn
+    conn.close()
+
+
+def plan(conn, sql, params):
+    return ' | '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+
+def test_migrates_to_latest(conn):
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    indexes = {row[1] for row in conn.execute('PRAGMA index_list(complaints)')}
+    assert {'idx_complaints_access_code', 'idx_complaints_status_created_ts', 'idx_complaints_created_ts'} <= indexes
+    assert not {'idx_complaints_created', 'idx_complaints_status_created'} & indexes
+
+
+def test_track_by_access_code(conn):
+    p = plan(conn, 'SELECT * FROM complaints WHERE access_code = ?', ('abc',))
+    assert 'USING INDEX idx_complaints_access_code' in p
+
+
+@pytest.mark.parametrize('sql, params, index', [
+    # Status filter plus a date range, newest first
+    ('SELECT c.* FROM complaints c WHERE c.status = ? AND c.created_ts >= ? AND c.created_ts < ?'
+     ' ORDER BY c.created_ts DESC, c.id DESC LIMIT ?', ('open', 0, 86400, 51), 'idx_complaints_status_created_ts'),
+    # Date range only
+    ('SELECT c.* FROM complaints c WHERE c.created_ts >= ? AND c.created_ts < ?'
+     ' ORDER BY c.created_ts DESC, c.id DESC LIMIT ?', (0, 86400, 51), 'idx_complaints_created_ts'),
+    # Keyset page after a cursor
+    ('SELECT c.* FROM complaints c WHERE (c.created_ts, c.id) < (?, ?)'
+     ' ORDER BY c.created_ts DESC, c.id DESC LIMIT ?', (86400, 10, 51), 'idx_complaints_created_ts'),
+    # Keyset page within a status
+    ('SELECT c.* FROM complaints c WHERE c.status = ? AND (c.created_ts, c.id) < (?, ?)'
+     ' ORDER BY c.created_ts DESC, c.id DESC LIMIT ?', ('closed', 86400, 10, 51), 'idx_complaints_status_created_ts'),
+    # Export with a date range
+    ('SELECT * FROM complaints WHERE created_ts >= ? AND created_ts < ? ORDER BY created_ts DESC',
+     (0, 86400), 'idx_complaints_created_ts'),
+])
+def test_filters_and_pages_use_created_ts_indexes(conn, sql, params, index):
+    p = plan(conn, sql, params)
+    assert f'USING INDEX {index}' in p or f'USING COVERING INDEX {index}' in p, p
+    assert 'TEMP B-TREE' not in p, p
+    assert 'SCAN complaints |' not in p + ' |' and 'SCAN c |' not in p + ' |', p
@@ -0,0 +1,61 @@
+"""Timed statements are reported when they finish, never from garbage collection."""
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+def _pool(tmp_path, seen):
+    pool = db.ConnectionPool(str(tmp_path / 't.db'), size=1,
+                             statement_hook=lambda sql, params, seconds: seen.append(sql))
+    conn = pool.acquire()
+    conn.execute('CREATE TABLE t (x INTEGER)')
+    conn.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(10)])
+    conn.commit()
+    del seen[:]
+    return pool, conn
+
+
+def test_exhausted_fetchmany_reports_once(tmp_path):
+    seen = []
+    pool, conn = _pool(tmp_path, seen)
+    cur = conn.execute('SELECT x FROM t')
+    while cur.fetchmany(4):
+        pass
+    assert seen == ['SELECT x FROM t']
+    cur.close()
+    pool.release(conn)
+    assert seen == ['SELECT x FROM t']
+
+
+def test_iterated_cursor_reported_at_release(tmp_path):
+    seen = []
+    pool, conn = _pool(tmp_path, seen)
+    gc.disable()
+    try:
+        cur = conn.execute('SELECT x FROM t')
+        assert sum(row[0] for row in cur) == 45
+        assert seen == []
+        pool.release(conn)
+        assert seen == ['SELECT x FROM t']
+        del cur
+    finally:
+        gc.enable()
+    gc.collect()
+    assert seen == ['SELECT x FROM t']
+
+
+def test_reuse_and_close_report(tmp_path):
+    seen = []
+    pool, conn = _pool(tmp_path, seen)
+    cur = conn.cursor()
+    cur.execute('SELECT x FROM t WHERE x = ?', (1,)).fetchone()
+    cur.execute('SELECT count(*) FROM t').fetchone()
+    assert seen == ['SELECT x FROM t WHERE x = ?']
+    cur.close()
+    assert seen == ['SELECT x FROM t WHERE x = ?', 'SELECT count(*) FROM t']
+    pool.release(conn)
+    assert len(seen) == 2
@@ -0,0 +1,120 @@
+"""Downscaled renditions of uploaded images, generated in the background.
+
+Renditions live next to the original as ``<original>.<size>.<fmt>`` (e.g.
+``ab/abcd….jpg.md.webp``), so they are content-addressed along with it and
+are removed together with it by :func:`media.remove_files`.
+
+Pillow is optional: without it no renditions are made and the app keeps
+serving original images.
+"""
+import importlib.util
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pillow takes a noticeable share of a cold start to import, so it is only
+# loaded when the first rendition is needed.
+Image = ImageOps = features = None
+
+log = logging.getLogger(__name__)
+
+# size name -> longest edge in pixels
+RENDITIONS = {'sm': 320, 'md': 800}
+FORMATS = ('webp', 'jpeg')
+_EXT = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def available():
+    return importlib.util.find_spec('PIL') is not None
+
+
+def _load_pillow():
+    global Image, ImageOps, features
+    if Image is None and available():
+        from PIL import Image, ImageOps, features
+    return Image is not None
+
+
+def supported_formats():
+    if not _load_pillow():
+        return ()
+    return tuple(f for f in FORMATS if f != 'webp' or features.check('webp'))
+
+
+def rendition_path(rel, size, fmt):
+    return f'{rel}.{size}.{_EXT[fmt]}'
+
+
+def generate(upload_folder, rel):
+    """Write every missing rendition of ``rel``; returns how many were made."""
+    src = os.path.join(upload_folder, rel)
+    formats = supported_formats()
+    todo = [
+        (size, fmt) for size in RENDITIONS for fmt in formats
+        if not os.path.exists(os.path.join(upload_folder, rendition_path(rel, size, fmt)))
+    ]
+    if not todo or not os.path.exists(src):
+        return 0
+    made = 0
+    with Image.open(src) as img:
+        biggest = max(RENDITIONS[size] for size, _fmt in todo)
+        # Let the JPEG decoder downscale while decoding; far cheaper on big photos
+        img.draft('RGB', (biggest, biggest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        for size, fmt in sorted(todo, key=lambda t: -RENDITIONS[t[0]]):
+            edge = RENDITIONS[size]
+            thumb = img.copy()
+            thumb.thumbnail((edge, edge), Image.LANCZOS)
+            dest = os.path.join(upload_folder, rendition_path(rel, size, fmt))
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix='.thumb-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    thumb.save(f, fmt.upper(), quality=80, optimize=True)
+                os.replace(tmp, dest)
+            except Exception:
+                os.remove(tmp)
+                raise
+            made += 1
+    return made
+
+
+class ThumbnailWorker:
+    """Small thread pool that renders thumbnails off the request path."""
+
+    def __init__(self, upload_folder, max_workers=2):
+        self.upload_folder = upload_folder
+        self.enabled = available() and max_workers > 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumbs') if self.enabled else None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, rel):
+        if not self.enabled or not rel:
+            return None
+        with self._lock:
+            if rel in self._pending:
+                return None
+            self._pending.add(rel)
+        return self._executor.submit(self._run, rel)
+
+    def _run(self, rel):
+        try:
+            return generate(self.upload_folder, rel)
+        except OSError as e:
+            # Not a decodable image (or a truncated one); keep serving the original
+            log.warning('no thumbnails for %s: %s', rel, e)
+            return 0
+        except Exception:
+            log.exception('thumbnail generation failed for %s', rel)
+            return 0
+        finally:
+            with self._lock:
+                self._pending.discard(rel)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
@@ -0,0 +1,159 @@
+"""Resumable, chunked video uploads.
+
+A client opens a session with the file's size, then sends it in pieces of at
+most ``chunk_size`` bytes, each in its own short request, and can ask for the
+current offset to resume after a dropped connection. A slow uploader holds a
+worker for one chunk at a time instead of the whole file, and a chunk is
+copied to disk ``media.CHUNK_SIZE`` bytes at a time. When the last byte
+arrives the file is hashed and moved into the content-addressed store; the
+complaint form then refers to it by upload id.
+
+Session state is a small JSON file next to the partial upload in
+``media.INCOMING_DIR``, so every worker on the host sees it and
+``manage.py gc-uploads`` expires abandoned sessions like any other partial
+upload.
+"""
+import hashlib
+import json
+import os
+import re
+import uuid
+
+import media
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent chunks for one session are not locked out
+    fcntl = None
+
+_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """A rejected upload request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _paths(upload_folder, upload_id):
+    if not _ID_RE.match(upload_id or ''):
+        return None
+    base = os.path.join(upload_folder, media.INCOMING_DIR, 'video-' + upload_id)
+    return base + '.json', base + '.part'
+
+
+def _write_meta(path, meta):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def create(upload_folder, ext, length):
+    """Open a session for a ``length``-byte file and return its upload id."""
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _paths(upload_folder, upload_id)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    open(part_path, 'xb').close()
+    _write_meta(meta_path, {'ext': ext, 'length': length, 'path': None})
+    return upload_id
+
+
+def status(upload_folder, upload_id):
+    """Session dict (``ext``, ``length``, ``offset``, ``path``), or None if unknown.
+
+    ``path`` is the stored media path once the last chunk has arrived.
+    """
+    paths = _paths(upload_folder, upload_id)
+    if paths is None:
+        return None
+    try:
+        with open(paths[0]) as f:
+            meta = json.load(f)
+        meta['offset'] = meta['length'] if meta['path'] else os.path.getsize(paths[1])
+    except (OSError, ValueError, KeyError):
+        return None
+    return meta
+
+
+def append(upload_folder, upload_id, offset, stream, length):
+    """Write ``length`` bytes from ``stream`` at ``offset``; returns the new status.
+
+    The offset must be where the partial file ends, so a retried chunk is
+    rejected with the current offset rather than written twice. If the
+    client goes away mid-chunk, what arrived is kept and it resumes from there.
+    """
+    meta = status(upload_folder, upload_id)
+    if meta is None:
+        raise UploadError('Unknown or expired upload', 404)
+    if meta['path'] or offset != meta['offset']:
+        raise UploadError('Offset does not match the upload', 409, meta['offset'])
+    if offset + length > meta['length']:
+        raise UploadError('Chunk runs past the declared size', 413, offset)
+    meta_path, part_path = _paths(upload_folder, upload_id)
+    with open(part_path, 'r+b') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise UploadError('Another chunk is being written', 409, offset)
+        f.seek(0, os.SEEK_END)
+        if f.tell() != offset:
+            raise UploadError('Offset does not match the upload', 409, f.tell())
+        # gc-uploads expires .incoming files by mtime: keep a slow but
+        # active session's metadata as fresh as its partial file
+        try:
+            os.utime(meta_path)
+        except OSError:
+            raise UploadError('Unknown or expired upload', 404)
+        left = length
+        while left:
+            data = stream.read(min(media.CHUNK_SIZE, left))
+            if not data:
+                break
+            f.write(data)
+            left -= len(data)
+        f.flush()
+        meta['offset'] = f.tell()
+        if meta['offset'] == meta['length']:
+            _finish(upload_folder, meta_path, part_path, meta)
+    return meta
+
+
+def _finish(upload_folder, meta_path, part_path, meta):
+    sha = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        for block in iter(lambda: f.read(media.CHUNK_SIZE), b''):
+            sha.update(block)
+    # The .part stays as the spare that claim() hands to media.settle()
+    meta['path'], _spare = media.adopt(upload_folder, part_path, sha.hexdigest(), meta['ext'])
+    _write_meta(meta_path, {k: meta[k] for k in ('ext', 'length', 'path')})
+
+
+def claim(upload_folder, upload_id):
+    """End a finished session; returns (stored media path, spare) or None.
+
+    ``spare`` goes to :func:`media.settle` once the complaint is saved.
+    """
+    meta = status(upload_folder, upload_id)
+    if meta is None or not meta['path']:
+        return None
+    meta_path, part_path = _paths(upload_folder, upload_id)
+    try:
+        os.remove(meta_path)
+    except OSError:
+        return None  # claimed by a concurrent submission
+    return meta['path'], part_path
+
+
+def discard(upload_folder, upload_id):
+    """Drop a session and its partial file (a finished file is left to the orphan sweep)."""
+    paths = _paths(upload_folder, upload_id)
+    for path in paths or ():
+        try:
+            os.remove(path)
+        except OSError:
+            pass